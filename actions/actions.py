@@ -17,18 +17,49 @@
 #
 # SPDX-License-Identifier: GPL-3.0-or-later
 
+import logging
+from concurrent.futures import Future, ThreadPoolExecutor
 from typing import Any, Callable, Optional
 
-from gi.repository import Adw, Gdk, Gio, GLib, Gtk
+from gi.repository import Adw, Gdk, Gio, GLib, GObject, Gtk
 
+from actions.timers import timers
 from actions.variables import (
     ActionsVariableEntryRow,
+    ActionsVariableRow,
     ActionsVariableSpinRow,
     VariableProperties,
     VariableReturn,
 )
 
 
+class Invocation:
+    """
+    A single execution of an action.
+
+    Holds the props to use for this execution, so the same action can be executed
+    by multiple runs at once. Call `done` with the return value when finished,
+    or `end` to stop the workflow.
+
+    `cancellable` is cancelled when the run is, actions that are still
+    running should then release their sources and not call back.
+    """
+
+    __slots__ = ("props", "done", "end", "cancellable")
+
+    def __init__(
+        self,
+        props: dict,
+        done: Callable[..., None],
+        end: Callable[[], None],
+        cancellable: Optional[Gio.Cancellable] = None,
+    ) -> None:
+        self.props = props
+        self.done = done
+        self.end = end
+        self.cancellable = cancellable or Gio.Cancellable()
+
+
 class Action(VariableReturn, VariableProperties):  # 🧑‍⚖️
     """The smallest part of a workflow."""
 
@@ -37,31 +68,115 @@ class Action(VariableReturn, VariableProperties):  # 🧑‍⚖️
     ident: str
     title: str
     icon_name: str
-    app: Gtk.Application
-    cb: Optional[Callable] = None
+    app: Optional[Gtk.Application]
 
-    retval: None = None
+    # Whether the action has to wait for all previous actions even when running in parallel
+    barrier: bool = False
 
-    def __init__(self, app: Gtk.Application) -> None:
+    # Whether the return value of a previous run can be reused
+    # if the action would be executed with the same props
+    replayable: bool = False
+
+    # Whether the return value only depends on props and executing has no side effects,
+    # so return values can be cached
+    pure: bool = False
+
+    def __init__(self, app: Optional[Gtk.Application] = None) -> None:
         VariableReturn.__init__(self)
         VariableProperties.__init__(self)
 
         self.app = app
 
-    def get_callable(self) -> Callable:
-        def wrapper() -> None:
-            self.emit("set-from-variable")
-            self._get_action_func()()
+    def _get_action_func(self) -> Callable[[Invocation], None]: ...
 
-        return wrapper
+    def get_widget(self) -> Gtk.Widget: ...
 
-    def _get_action_func(self) -> Callable: ...
+    def bind_widget(self, widget: Gtk.Widget) -> None:
+        """
+        Shows `self` in `widget`, which was created by `get_widget()`
+        of another action of the same class.
 
-    def get_widget(self) -> Gtk.Widget: ...
+        Variable rows are bound to `self`, override this if the widget shows more.
+        """
+        stack = [widget]
+
+        while stack:
+            if isinstance(current := stack.pop(), ActionsVariableRow):
+                current.bind(self)
+
+            child = current.get_first_child()
+            while child:
+                stack.append(child)
+                child = child.get_next_sibling()
+
+
+class BlockingAction(Action):
+    """
+    An action that does blocking work, which is run in a thread pool.
 
-    def _done(self) -> None:
-        if self.cb:
-            self.cb()
+    Subclasses implement `work()`, which is called on a worker thread
+    and must not touch widgets. Its return value is passed back
+    to the main loop as the return value of the action.
+    """
+
+    __gtype_name__ = "ActionsBlockingAction"
+
+    max_workers: int = 4
+    _pool: Optional[ThreadPoolExecutor] = None
+
+    @staticmethod
+    def set_max_workers(max_workers: int) -> None:
+        """Sets the number of worker threads shared by all blocking actions."""
+        if BlockingAction._pool:
+            BlockingAction._pool.shutdown(wait=False)
+            BlockingAction._pool = None
+
+        BlockingAction.max_workers = max_workers
+
+    @staticmethod
+    def _get_pool() -> ThreadPoolExecutor:
+        if not BlockingAction._pool:
+            BlockingAction._pool = ThreadPoolExecutor(
+                max_workers=BlockingAction.max_workers,
+                thread_name_prefix="actions-worker",
+            )
+
+        return BlockingAction._pool
+
+    def work(self, props: dict) -> Any:
+        """Does the work of the action with `props` and returns the return value."""
+
+    def _get_action_func(self) -> Callable:
+        def run_in_pool(call: Invocation) -> None:
+            # Copy so edits on the main thread don't race with the worker
+            future = self._get_pool().submit(self.work, dict(call.props))
+
+            # Work that has already started can't be stopped, its result is ignored.
+            # `Gio.Cancellable.connect()` is `g_cancellable_connect()`, not the signal one
+            handler_id = GObject.Object.connect(
+                call.cancellable, "cancelled", lambda *_: future.cancel()
+            )
+            future.add_done_callback(
+                lambda future: GLib.idle_add(self._finish, call, future, handler_id)
+            )
+
+        return run_in_pool
+
+    def _finish(self, call: Invocation, future: Future, handler_id: int) -> bool:
+        GObject.signal_handler_disconnect(call.cancellable, handler_id)
+
+        if call.cancellable.is_cancelled():
+            return GLib.SOURCE_REMOVE
+
+        try:
+            retval = future.result()
+        except Exception:  # pylint: disable=broad-exception-caught
+            logging.exception("%s failed", self.ident)
+            call.end()
+        else:
+            call.done(retval)
+
+        return GLib.SOURCE_REMOVE
 
 
 class NotificationAction(Action):
@@ -92,18 +207,17 @@ class NotificationAction(Action):
         }
 
     def _get_action_func(self) -> Callable:
-        def send_notification() -> None:
-            if not (self.app):
-                return
+        def send_notification(call: Invocation) -> None:
+            # Without an application (e.g. when running headless), just move on
+            if self.app:
+                notif = Gio.Notification.new(call.props["title"] or _("Notification"))
 
-            notif = Gio.Notification.new(self.props["title"] or _("Notification"))
+                if body := call.props["body"]:
+                    notif.set_body(body)
 
-            if body := self.props["body"]:
-                notif.set_body(body)
+                self.app.send_notification(None, notif)
 
-            self.app.send_notification(None, notif)
-
-            self._done()
+            call.done()
 
         return send_notification
 
@@ -132,6 +246,11 @@ class NotificationAction(Action):
 
         return expander
 
+    def bind_widget(self, widget: Gtk.Widget) -> None:
+        # Like a new row, which starts collapsed
+        widget.set_expanded(False)
+        super().bind_widget(widget)
+
 
 class RingBellAction(Action):
     __gtype_name__ = "ActionsRingBellAction"
@@ -148,13 +267,11 @@ class RingBellAction(Action):
 
     def _get_action_func(self) -> Callable:
 
-        def ring_bell() -> None:
-            if not (display := Gdk.Display.get_default()):
-                return
-
-            display.beep()
+        def ring_bell(call: Invocation) -> None:
+            if display := Gdk.Display.get_default():
+                display.beep()
 
-            self._done()
+            call.done()
 
         return ring_bell
 
@@ -185,6 +302,7 @@ class WaitAction(Action):
     title = _("Wait")
     icon_name = "preferences-system-time-symbolic"
     type = float
+    replayable = True
 
     def __init__(self, *args: Any, **kwargs: Any) -> None:
         super().__init__(*args, **kwargs)
@@ -195,15 +313,23 @@ class WaitAction(Action):
 
     def _get_action_func(self) -> Callable:
 
-        def wait() -> None:
-            if not self.cb:
+        def wait(call: Invocation) -> None:
+            seconds = call.props["seconds"]
+            cancellable = call.cancellable
+
+            if cancellable.is_cancelled():
                 return
 
             def timeout_done() -> None:
-                self.retval = self.props["seconds"]
-                self._done()
+                GObject.signal_handler_disconnect(cancellable, handler_id)
+                call.done(seconds)
 
-            GLib.timeout_add_seconds(self.props["seconds"], timeout_done)
+            def cancelled(*_args: Any) -> None:
+                GObject.signal_handler_disconnect(cancellable, handler_id)
+                timer.cancel()
+
+            timer = timers.add(seconds, timeout_done)
+            handler_id = GObject.Object.connect(cancellable, "cancelled", cancelled)
 
         return wait
 
@@ -216,6 +342,7 @@ class WaitAction(Action):
                     lower=0,
                     value=self.props["seconds"],
                 ),
+                digits=3,
                 props=self,
                 key="seconds",
                 title=self.title,
@@ -239,9 +366,10 @@ class ReturnAction(Action):
     ident = "return"
     title = _("End")
     icon_name = "media-playback-stop-symbolic"
+    barrier = True
 
     def _get_action_func(self) -> Callable:
-        return lambda: None
+        return lambda call: call.end()
 
     def get_widget(self) -> Gtk.Widget:
         return Adw.ActionRow(title=self.title, icon_name=self.icon_name)
@@ -270,6 +398,8 @@ class FloatVariableAction(Action):
     title = _("Number")
     icon_name = "accessories-calculator-symbolic"
     type = float
+    replayable = True
+    pure = True
 
     def __init__(self, *args: Any, **kwargs: Any) -> None:
         super().__init__(*args, **kwargs)
@@ -280,9 +410,8 @@ class FloatVariableAction(Action):
 
     def _get_action_func(self) -> Callable:
 
-        def number() -> None:
-            self.retval = self.props["float"]
-            self._done()
+        def number(call: Invocation) -> None:
+            call.done(call.props["float"])
 
         return number
 
@@ -330,6 +459,8 @@ class StringVariableAction(Action):
     title = _("Text")
     icon_name = "text-x-generic-symbolic"
     type = str
+    replayable = True
+    pure = True
 
     def __init__(self, *args: Any, **kwargs: Any) -> None:
         super().__init__(*args, **kwargs)
@@ -339,9 +470,8 @@ class StringVariableAction(Action):
         }
 
     def _get_action_func(self) -> Callable:
-        def text() -> None:
-            self.retval = self.props["string"]
-            self._done()
+        def text(call: Invocation) -> None:
+            call.done(call.props["string"])
 
         return text
 
@@ -0,0 +1,281 @@
+# autosave.py
+#
+# Copyright 2024 kramo
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+"""Saving workflows continuously by journaling edits."""
+
+import json
+import logging
+import threading
+from pathlib import Path
+from typing import Any, Callable, Optional
+
+from gi.repository import GLib
+
+from actions.engine import ActionSpec
+from actions.storage import load_file, save_file
+
+_separators = (",", ":")
+
+
+class Autosave:
+    """
+    Keeps a copy of a workflow on disk by appending edits to a journal.
+
+    Edits are batched in memory and appended every `flush_interval` milliseconds,
+    so the cost of an edit doesn't depend on the size of the workflow.
+    Once `compact_after` edits were written, the journal is merged into
+    a full snapshot in a background thread.
+
+    Snapshots and journals are numbered by a generation: a snapshot contains
+    all journals up to its own generation, so only newer journals are replayed
+    when recovering, even if the app quit in the middle of compacting.
+
+    `before_flush` is called before pending edits are written, so edits that
+    are not recorded right away, like with the `lazy-props` setting, can be.
+    Call `schedule_flush()` when there are such edits.
+    """
+
+    _source_id: int = 0
+    _written: int = 0
+    _compacting: bool = False
+
+    # Counts calls to `discard()`, so a compaction started before one doesn't write
+    _discards: int = 0
+
+    def __init__(
+        self,
+        directory: Path,
+        flush_interval: int = 1000,
+        compact_after: int = 1000,
+        before_flush: Optional[Callable[[], None]] = None,
+    ) -> None:
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self.compact_after = compact_after
+        self.before_flush = before_flush
+
+        self._pending = []
+        self._lock = threading.Lock()
+        self.generation = (
+            max(
+                self._get_generations("journal") + self._get_generations("workflow"),
+                default=0,
+            )
+            + 1
+        )
+
+    def add(self, ident: str, props: dict) -> None:
+        """Records that an action with `ident` and `props` was appended."""
+        self._record("add", ident, props)
+
+    def set_prop(self, index: int, key: str, value: Any) -> None:
+        """Records that `key` of the props of the action at `index` was set to `value`."""
+        self._record("set", index, key, value)
+
+    def set_sources(self, index: int, sources: dict[str, int]) -> None:
+        """Records that the action at `index` is now bound to the actions in `sources`."""
+        self._record("bind", index, sources)
+
+    def reset(self, specs: list[ActionSpec]) -> None:
+        """Starts over from `specs`, like after opening a workflow."""
+        self._pending.clear()
+        self._cancel_flush()
+
+        self.generation += 1
+        self._write_snapshot(self.generation - 1, list(specs))
+
+    def schedule_flush(self) -> None:
+        """Flushes after `flush_interval` milliseconds, unless a flush is due already."""
+        if not self._source_id:
+            self._source_id = GLib.timeout_add(self.flush_interval, self._on_timeout)
+
+    def flush(self) -> None:
+        """Appends all pending edits to the journal."""
+        if self.before_flush:
+            self.before_flush()
+
+        # After `before_flush`, which can record edits and schedule another flush
+        self._cancel_flush()
+
+        if not self._pending:
+            return
+
+        lines = "".join(line + "\n" for line in self._pending)
+        written = len(self._pending)
+        self._pending.clear()
+
+        try:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            with self._get_path(self.generation, "journal").open(
+                "a", encoding="utf-8"
+            ) as journal:
+                journal.write(lines)
+        except OSError as error:
+            logging.warning("Cannot write autosave journal: %s", error)
+            return
+
+        self._written += written
+
+        if self._written >= self.compact_after:
+            self.compact()
+
+    def compact(self) -> None:
+        """Merges the journal into a new snapshot in a background thread."""
+        if self._compacting:
+            return
+
+        self._compacting = True
+        self._written = 0
+
+        # New edits go to a new journal while the old ones are merged
+        self.generation += 1
+        merged = self.generation - 1
+
+        discards = self._discards
+
+        def merge() -> None:
+            try:
+                with self._lock:
+                    specs = self._replay(merged)
+
+                self._write_snapshot(merged, specs, discards)
+            finally:
+                self._compacting = False
+
+        threading.Thread(target=merge, daemon=True).start()
+
+    def recover(self) -> Optional[list[ActionSpec]]:
+        """Gets the autosaved workflow, if there is one."""
+        with self._lock:
+            specs = self._replay(None)
+
+        return specs or None
+
+    def discard(self) -> None:
+        """Removes the autosaved workflow, like after quitting cleanly."""
+        self._pending.clear()
+        self._cancel_flush()
+
+        with self._lock:
+            self._discards += 1
+
+            for suffix in ("workflow", "journal"):
+                for generation in self._get_generations(suffix):
+                    self._get_path(generation, suffix).unlink(missing_ok=True)
+
+    def _record(self, *record: Any) -> None:
+        self._pending.append(json.dumps(record, separators=_separators))
+        self.schedule_flush()
+
+    def _on_timeout(self) -> bool:
+        self._source_id = 0
+        self.flush()
+        return GLib.SOURCE_REMOVE
+
+    def _cancel_flush(self) -> None:
+        if self._source_id:
+            GLib.source_remove(self._source_id)
+            self._source_id = 0
+
+    def _write_snapshot(
+        self,
+        generation: int,
+        specs: list[ActionSpec],
+        discards: Optional[int] = None,
+    ) -> None:
+        with self._lock:
+            # Discarded while it was being merged
+            if discards is not None and discards != self._discards:
+                return
+
+            try:
+                self.directory.mkdir(parents=True, exist_ok=True)
+                save_file(self._get_path(generation, "workflow"), specs)
+            except OSError as error:
+                logging.warning("Cannot write autosave snapshot: %s", error)
+                return
+
+            # Everything older is part of the snapshot now
+            for suffix in ("workflow", "journal"):
+                for older in self._get_generations(suffix):
+                    if older < generation or (
+                        suffix == "journal" and older == generation
+                    ):
+                        self._get_path(older, suffix).unlink(missing_ok=True)
+
+    def _replay(self, until: Optional[int]) -> list[ActionSpec]:
+        # Loads the newest snapshot and applies newer journals up to `until`
+        snapshots = self._get_generations("workflow")
+        base = snapshots[-1] if snapshots else -1
+        specs = []
+
+        if snapshots:
+            try:
+                specs = load_file(self._get_path(base, "workflow"))
+            except (OSError, ValueError) as error:
+                logging.warning("Cannot read autosave snapshot: %s", error)
+
+        for generation in self._get_generations("journal"):
+            if generation <= base or (until is not None and generation > until):
+                continue
+
+            try:
+                with self._get_path(generation, "journal").open(
+                    encoding="utf-8"
+                ) as journal:
+                    for line in journal:
+                        try:
+                            _apply(specs, json.loads(line))
+                        except (ValueError, IndexError, TypeError):
+                            # Most likely the last line, cut off by a crash
+                            break
+            except OSError as error:
+                logging.warning("Cannot read autosave journal: %s", error)
+
+        return specs
+
+    def _get_path(self, generation: int, suffix: str) -> Path:
+        return self.directory / f"autosave-{generation}.{suffix}"
+
+    def _get_generations(self, suffix: str) -> list[int]:
+        try:
+            paths = tuple(self.directory.glob(f"autosave-*.{suffix}"))
+        except OSError:
+            return []
+
+        generations = []
+        for path in paths:
+            try:
+                generations.append(int(path.stem.removeprefix("autosave-")))
+            except ValueError:
+                continue
+
+        return sorted(generations)
+
+
+def _apply(specs: list[ActionSpec], record: list) -> None:
+    match record:
+        case ["add", str(ident), dict(props)]:
+            specs.append(ActionSpec(ident, props, {}))
+        case ["set", int(index), str(key), value]:
+            specs[index].props[key] = value
+        case ["bind", int(index), dict(sources)]:
+            specs[index] = specs[index]._replace(bindings=sources)
+        case _:
+            raise ValueError(f"Unknown autosave record: {record}")
@@ -0,0 +1,120 @@
+# batch.py
+#
+# Copyright 2024 kramo
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+"""Running workflows from the command line, without a display."""
+
+import argparse
+import builtins
+import gettext
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Optional, Sequence
+
+from actions.engine import Workflow
+from actions.storage import load_file
+
+# Workflows are only loaded once per process
+_workflows: dict[tuple[str, bool], Workflow] = {}
+
+
+def run_file(path: str, parallel: bool = False) -> float:
+    """Runs the workflow at `path` once and returns how long it took in seconds."""
+    if not (workflow := _workflows.get((path, parallel))):
+        workflow = _workflows[(path, parallel)] = Workflow(load_file(Path(path)))
+
+    start = time.perf_counter()
+    workflow.run_sync(parallel=parallel)
+    return time.perf_counter() - start
+
+
+def _init_worker() -> None:
+    # Workers that are spawned instead of forked don't have `_` yet
+    if not hasattr(builtins, "_"):
+        gettext.install("actions")
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    """Entry point for `actions run`."""
+    parser = argparse.ArgumentParser(
+        prog="actions run", description=_("Run workflows without a window")
+    )
+    parser.add_argument("files", nargs="+", metavar="FILE", help=_("Workflow files"))
+    parser.add_argument(
+        "--repeat",
+        type=int,
+        default=1,
+        metavar="N",
+        help=_("Run each workflow N times"),
+    )
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=1,
+        metavar="K",
+        help=_("Run up to K workflows at once in separate processes"),
+    )
+    parser.add_argument(
+        "--parallel",
+        action="store_true",
+        help=_("Run actions that don't depend on each other at the same time"),
+    )
+    args = parser.parse_args(argv)
+
+    if args.repeat < 1 or args.jobs < 1:
+        parser.error(_("--repeat and --jobs must be at least 1"))
+
+    # Fail early instead of in every run
+    for path in args.files:
+        try:
+            load_file(Path(path))
+        except (OSError, ValueError) as error:
+            print(f"{path}: {error}", file=sys.stderr)
+            return 1
+
+    runs = [path for path in args.files for _index in range(args.repeat)]
+    start = time.perf_counter()
+
+    if args.jobs == 1:
+        timings = (run_file(path, args.parallel) for path in runs)
+    else:
+        pool = ProcessPoolExecutor(max_workers=args.jobs, initializer=_init_worker)
+        timings = pool.map(
+            run_file,
+            runs,
+            (args.parallel,) * len(runs),
+            chunksize=max(1, len(runs) // (args.jobs * 4)),
+        )
+
+    try:
+        for index, (path, seconds) in enumerate(zip(runs, timings)):
+            print(f"{path} #{index % args.repeat + 1}: {seconds * 1000:.3f} ms")
+    finally:
+        if args.jobs != 1:
+            pool.shutdown()
+
+    elapsed = time.perf_counter() - start
+    print(
+        _("{} runs in {:.3f} s ({:.1f} runs/s)").format(
+            len(runs), elapsed, len(runs) / elapsed if elapsed else float("inf")
+        )
+    )
+
+    return 0
@@ -0,0 +1,92 @@
+# cache.py
+#
+# Copyright 2024 kramo
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+"""Caching return values of pure actions."""
+
+from collections import OrderedDict
+from typing import Any, Hashable
+
+
+class LRUCache:
+    """
+    A cache with a size limit that evicts the least recently used entries.
+
+    Counts `hits` and `misses` of `get()`.
+    """
+
+    hits: int = 0
+    misses: int = 0
+
+    def __init__(self, maxsize: int = 1024) -> None:
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._entries
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Gets the value for `key`, or `default` if it is not cached."""
+        try:
+            value = self._entries[key]
+        except KeyError:
+            self.misses += 1
+            return default
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key: Hashable, value: Any) -> None:
+        """Caches `value` for `key`, evicting the oldest entries if the cache is full."""
+        if self.maxsize <= 0:
+            return
+
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        """Removes all entries and resets the counters."""
+        self._entries.clear()
+        self.hits = self.misses = 0
+
+
+def get_key(ident: str, props: dict) -> Hashable:
+    """
+    Gets a cache key for an action with `ident` executed with `props`.
+
+    Raises `TypeError` if a value in `props` can't be part of a key.
+    """
+    return (ident, _normalize(props))
+
+
+def _normalize(value: Any) -> Hashable:
+    if isinstance(value, dict):
+        return tuple(sorted((key, _normalize(item)) for key, item in value.items()))
+
+    if isinstance(value, (list, tuple)):
+        return tuple(_normalize(item) for item in value)
+
+    hash(value)
+    return value
@@ -0,0 +1,553 @@
+# engine.py
+#
+# Copyright 2024 kramo
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+"""Running workflows without a window or any widgets."""
+
+import logging
+from collections import deque
+from typing import Any, Callable, Iterable, NamedTuple, Optional, Sequence, Type
+
+from gi.repository import Gio, GLib, Gtk
+
+from actions import memory, tracing
+from actions.actions import Action, Invocation
+from actions.cache import LRUCache, get_key
+from actions.registry import registry
+from actions.variables import VariableProperties
+
+# Shared by all plans, so results outlive edits to workflows
+memo_cache = LRUCache(maxsize=1024)
+
+
+class ActionSpec(NamedTuple):
+    """
+    A plain description of an action in a workflow.
+
+    `bindings` maps keys of `props` to the index of an earlier action
+    in the workflow whose return value should be used instead.
+    """
+
+    ident: str
+    props: Optional[dict] = None
+    bindings: Optional[dict] = None
+
+
+def get_action_class(ident: str) -> Type[Action]:
+    """Gets the `Action` subclass for `ident`, importing it from a plugin if needed."""
+    return registry.get_action_class(ident)
+
+
+class Binding(NamedTuple):
+    """Sets `key` on the props of the action at `target` from the one at `source`."""
+
+    target: int
+    key: str
+    source: int
+
+
+def get_bindings(actions: Sequence[VariableProperties]) -> list[Binding]:
+    """Gets the bindings for `actions` from their `sources`."""
+    indices = {action: index for index, action in enumerate(actions)}
+
+    return [
+        Binding(index, key, indices[source])
+        for index, action in enumerate(actions)
+        for key, source in action.sources.items()
+    ]
+
+
+class Plan(NamedTuple):
+    """
+    An immutable, compiled form of a workflow.
+
+    A plan can be executed any number of times, so it should be cached
+    and only compiled again when the workflow is edited.
+    """
+
+    actions: tuple[Action, ...]
+    bindings: tuple[Binding, ...]
+    steps: tuple[Callable, ...]
+
+    # For each action, the number of actions it has to wait for
+    # and the indices of the actions waiting for it
+    dependencies: tuple[int, ...]
+    dependents: tuple[tuple[int, ...], ...]
+
+
+def compile_plan(
+    actions: Sequence[Action],
+    bindings: Iterable[Binding] = (),
+    cache: Optional[LRUCache] = memo_cache,
+) -> Plan:
+    """
+    Compiles `actions` into a `Plan`.
+
+    `bindings` are resolved into a table that steps apply directly
+    from the return values of the run.
+
+    Return values of pure actions are kept in `cache`, pass None to disable this.
+    """
+    actions = tuple(actions)
+    bindings = tuple(bindings)
+    by_target = {}
+
+    for binding in bindings:
+        if not 0 <= binding.source < binding.target < len(actions):
+            raise ValueError(
+                f"Action {binding.target} can only be bound to an earlier action, "
+                f"not {binding.source}"
+            )
+
+        by_target.setdefault(binding.target, []).append((binding.key, binding.source))
+
+    return Plan(
+        actions,
+        bindings,
+        tuple(
+            _bind_step(index, action, tuple(by_target.get(index, ())), cache)
+            for index, action in enumerate(actions)
+        ),
+        *_get_graph(actions, bindings),
+    )
+
+
+def _get_graph(
+    actions: tuple[Action, ...], bindings: tuple[Binding, ...]
+) -> tuple[tuple[int, ...], tuple[tuple[int, ...], ...]]:
+    sources = [set() for _action in actions]
+
+    for binding in bindings:
+        sources[binding.target].add(binding.source)
+
+    # Barriers wait for everything before them and everything after waits for them
+    barrier = None
+    for index, action in enumerate(actions):
+        if barrier is not None:
+            sources[index].add(barrier)
+
+        if action.barrier:
+            sources[index].update(range(barrier or 0, index))
+            barrier = index
+
+    dependents = [[] for _action in actions]
+    for index, action_sources in enumerate(sources):
+        for source in action_sources:
+            dependents[source].append(index)
+
+    return (
+        tuple(len(action_sources) for action_sources in sources),
+        tuple(tuple(action_dependents) for action_dependents in dependents),
+    )
+
+
+def _bind_step(
+    index: int,
+    action: Action,
+    sources: tuple[tuple[str, int], ...],
+    cache: Optional[LRUCache],
+) -> Callable:
+    func = action._get_action_func()  # pylint: disable=protected-access
+    ident = action.ident
+    replayable = action.replayable
+
+    if memory.enabled:
+        func = memory.wrap(ident, func)
+
+    if action.pure and cache is not None:
+        func = _memoize(action.ident, func, cache)
+
+    def step(context: "RunContext", done: Callable, end: Callable) -> None:
+        trace = context.trace
+        start = tracing.now() if trace else 0.0
+
+        props = action.props
+        inputs = context.inputs.get(index)
+
+        if sources or inputs:
+            props = {**props, **(inputs or {})}
+            retvals = context.retvals
+
+            for key, source in sources:
+                props[key] = retvals[source]
+
+        if replayable and context.record:
+            # Changed sources show up as changed props too
+            if (previous := context.previous) and (
+                previous_props := previous.get_props(index, action)
+            ) == props:
+                context.props[index] = previous_props
+                done(previous.retvals[index])
+                return
+
+            context.props[index] = dict(props)
+
+        if not trace:
+            func(Invocation(props, done, end, context.cancellable))
+            return
+
+        trace.span("bind", "bind", start, index=index, action=ident)
+
+        done, action_returned = trace.wrap_done(index, ident, done)
+        start = tracing.now()
+
+        func(Invocation(props, done, end, context.cancellable))
+
+        trace.span(ident, "execute", start, index=index)
+        action_returned()
+
+    return step
+
+
+def _memoize(ident: str, func: Callable, cache: LRUCache) -> Callable:
+    missing = object()
+
+    def memoized(call: Invocation) -> None:
+        try:
+            key = get_key(ident, call.props)
+        except TypeError:
+            func(call)
+            return
+
+        if (retval := cache.get(key, missing)) is not missing:
+            call.done(retval)
+            return
+
+        def done(retval: Any = None) -> None:
+            cache.put(key, retval)
+            call.done(retval)
+
+        func(Invocation(call.props, done, call.end, call.cancellable))
+
+    return memoized
+
+
+class RunContext:
+    """
+    The inputs and return values of a single run of a plan.
+
+    `inputs` maps the index of an action to props overriding its own for this run.
+
+    If `record` is True, the props that replayable actions were executed with are kept,
+    and actions executed with the same props as in `previous` reuse its return values.
+
+    `cancellable` is cancelled once the run ends, so actions still running stop.
+    `trace` records the run if tracing is enabled, see `actions.tracing`.
+    """
+
+    def __init__(
+        self,
+        plan: Plan,
+        inputs: Optional[dict[int, dict]] = None,
+        previous: Optional["RunContext"] = None,
+        record: bool = False,
+    ) -> None:
+        length = len(plan.actions)
+
+        self.actions = plan.actions
+        self.inputs = inputs or {}
+        self.retvals = [None] * length
+        self.completed = [False] * length
+        self.cancellable = Gio.Cancellable()
+        self.trace = tracing.start_run()
+
+        self.previous = previous
+        self.record = record
+        self.props = [None] * length if record else []
+
+        # Only one run back is needed
+        if previous:
+            previous.previous = None
+
+    def get_props(self, index: int, action: Action) -> Optional[dict]:
+        """
+        Gets the props `action` at `index` was executed with,
+        if it was recorded and it has finished.
+        """
+        if (
+            index >= len(self.props)
+            or (self.actions[index] is not action)
+            or (not self.completed[index])
+        ):
+            return None
+
+        return self.props[index]
+
+
+class Executor:
+    """
+    Drives a list of actions with a program counter instead of chaining their callbacks.
+
+    Actions that finish synchronously are stepped through in a loop, and the loop
+    resumes when an asynchronous action (like `WaitAction`) is done,
+    so the stack depth stays the same no matter how long the workflow is.
+
+    All state of the run is kept in the executor and its `context`,
+    so a plan can be executed by any number of executors at once.
+
+    The executor is also the handle of the run, call `cancel()` to stop it.
+
+    See `RunContext` for `inputs`, `previous` and `record`.
+    """
+
+    pc: int = 0
+    finished: bool = False
+    cancelled: bool = False
+
+    _running: bool = False
+    _stepped: bool = False
+
+    def __init__(
+        self,
+        plan: Plan,
+        cb: Optional[Callable] = None,
+        inputs: Optional[dict[int, dict]] = None,
+        previous: Optional[RunContext] = None,
+        record: bool = False,
+    ) -> None:
+        self.plan = plan
+        self.cb = cb
+        self.context = RunContext(plan, inputs, previous, record)
+
+    def start(self) -> None:
+        """Starts executing from the first action."""
+        self._loop()
+
+    def cancel(self) -> None:
+        """
+        Ends the run early, cancelling actions that are still running.
+
+        `cb` is still called, `cancelled` can be used to tell the difference.
+        """
+        if self.finished:
+            return
+
+        self.cancelled = True
+        self._end()
+
+    def _loop(self) -> None:
+        steps = self.plan.steps
+        length = len(steps)
+        context = self.context
+        step_done = self._step_done
+        end = self._end
+
+        self._running = True
+
+        while (not self.finished) and (self.pc < length):
+            self._stepped = False
+
+            try:
+                steps[self.pc](context, step_done, end)
+            except Exception:  # pylint: disable=broad-exception-caught
+                logging.exception("%s failed", self.plan.actions[self.pc].ident)
+                end()
+                break
+
+            # The action has not called back yet, it will resume the loop when done
+            if not self._stepped:
+                break
+
+            self.pc += 1
+
+        self._running = False
+
+        if self.pc >= length:
+            self._end()
+
+    def _step_done(self, retval: Any = None) -> None:
+        if self.finished:
+            return
+
+        self.context.retvals[self.pc] = retval
+        self.context.completed[self.pc] = True
+
+        if self._running:
+            self._stepped = True
+            return
+
+        self.pc += 1
+        self._loop()
+
+    def _end(self) -> None:
+        if self.finished:
+            return
+
+        self.finished = True
+
+        # Releases the sources of actions that are still running, like with `ReturnAction`
+        self.context.cancellable.cancel()
+
+        if self.context.trace:
+            self.context.trace.end(self.cancelled)
+
+        if self.cb:
+            self.cb()
+
+
+class DagExecutor(Executor):
+    """
+    Starts every action as soon as the actions it takes variables from are done,
+    instead of going through them in order.
+
+    The dependency graph is derived from the plan's bindings,
+    so two independent `WaitAction`s take as long as the longer one.
+    Barrier actions like `ReturnAction` still wait for every action before them.
+    """
+
+    def __init__(self, plan: Plan, *args: Any, **kwargs: Any) -> None:
+        super().__init__(plan, *args, **kwargs)
+
+        self._waiting = list(plan.dependencies)
+        self._remaining = len(plan.steps)
+        self._ready = deque()
+
+    def start(self) -> None:
+        if not self._remaining:
+            self._end()
+            return
+
+        self._ready.extend(
+            index for index, count in enumerate(self._waiting) if not count
+        )
+        self._drain()
+
+    def _drain(self) -> None:
+        # Actions that are done synchronously add to `_ready` instead of recursing
+        if self._running:
+            return
+
+        steps = self.plan.steps
+        context = self.context
+        ready = self._ready
+        end = self._end
+
+        self._running = True
+
+        while ready and (not self.finished):
+            index = ready.popleft()
+
+            try:
+                steps[index](
+                    context,
+                    lambda retval=None, index=index: self._action_done(index, retval),
+                    end,
+                )
+            except Exception:  # pylint: disable=broad-exception-caught
+                logging.exception("%s failed", self.plan.actions[index].ident)
+                end()
+
+        self._running = False
+
+    def _action_done(self, index: int, retval: Any) -> None:
+        if self.finished:
+            return
+
+        self.context.retvals[index] = retval
+        self.context.completed[index] = True
+        self._remaining -= 1
+
+        waiting = self._waiting
+        for dependent in self.plan.dependents[index]:
+            waiting[dependent] -= 1
+
+            if not waiting[dependent]:
+                self._ready.append(dependent)
+
+        if not self._remaining:
+            self._end()
+            return
+
+        self._drain()
+
+
+class Workflow:
+    """A workflow built from `ActionSpec`s, without calling `Action.get_widget()`."""
+
+    plan: Plan
+
+    def __init__(
+        self,
+        specs: Iterable[ActionSpec],
+        app: Optional[Gtk.Application] = None,
+        cache: Optional[LRUCache] = memo_cache,
+    ) -> None:
+        actions = []
+        bindings = []
+
+        for index, spec in enumerate(specs):
+            action = get_action_class(spec.ident)(app)
+            action.props = {**action.props, **(spec.props or {})}
+            actions.append(action)
+
+            for key, source in (spec.bindings or {}).items():
+                bindings.append(Binding(index, key, source))
+
+                # So the actions can be shown in a window as well
+                if 0 <= source < index:
+                    action.sources[key] = actions[source]
+
+        self.plan = compile_plan(actions, bindings, cache)
+
+    @property
+    def actions(self) -> tuple[Action, ...]:
+        """The actions in the workflow."""
+        return self.plan.actions
+
+    def run(
+        self,
+        cb: Optional[Callable] = None,
+        inputs: Optional[dict[int, dict]] = None,
+        parallel: bool = False,
+        **kwargs: Any,
+    ) -> Executor:
+        """
+        Executes the workflow.
+
+        `cb` is called once the last action is done or the workflow is ended early.
+        Runs are independent of each other, so this can be called again
+        before a previous run has finished. Call `cancel()` on the returned
+        executor to stop the run.
+
+        If `parallel` is True, actions that don't depend on each other run
+        at the same time, see `DagExecutor`.
+
+        Other arguments are passed to `RunContext`, to re-run incrementally
+        pass `record=True` and the `context` of the last executor as `previous`.
+        """
+        (
+            executor := (DagExecutor if parallel else Executor)(
+                self.plan, cb, inputs, **kwargs
+            )
+        ).start()
+        return executor
+
+    def run_sync(self, parallel: bool = False) -> None:
+        """Executes the workflow on a new `GLib.MainLoop`, returning when it finishes."""
+        loop = GLib.MainLoop()
+        finished = False
+
+        def done() -> None:
+            nonlocal finished
+            finished = True
+            loop.quit()
+
+        self.run(done, parallel=parallel)
+
+        if not finished:
+            loop.run()
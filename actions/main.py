@@ -18,8 +18,10 @@
 # SPDX-License-Identifier: GPL-3.0-or-later
 
 """The main application singleton class."""
+import os
 import sys
-from typing import Any, Optional, Sequence
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Optional, Sequence
 
 import gi
 
@@ -29,15 +31,23 @@ gi.require_version("Adw", "1")
 # pylint: disable=wrong-import-position
 # pylint: disable=wrong-import-order
 
-from gi.repository import Adw, Gio, Gtk
+from gi.repository import Adw, Gio, GLib, Gtk
 
-from actions import shared
-from actions.window import ActionsWindow
+from actions import memory, shared, startup, tracing
+
+if TYPE_CHECKING:
+    from actions.service import WorkflowService
 
 
 class ActionsApplication(Adw.Application):
     """The main application singleton class."""
 
+    service_mode: bool = False
+    service: Optional["WorkflowService"] = None
+
+    # Starting the service activates the app as well, without asking for a window
+    _skip_activate: bool = False
+
     def __init__(self):
         super().__init__(
             application_id=shared.APP_ID, flags=Gio.ApplicationFlags.DEFAULT_FLAGS
@@ -57,6 +67,107 @@ class ActionsApplication(Adw.Application):
             "about",
             self.on_about_action,
         )
+        self.create_action(
+            "open",
+            lambda *_: self.get_active_window().open(),
+            ("<primary>o",),
+        )
+        self.create_action(
+            "save",
+            lambda *_: self.get_active_window().save(),
+            ("<primary>s",),
+        )
+
+        self.add_main_option(
+            "profile-startup",
+            0,
+            GLib.OptionFlags.NONE,
+            GLib.OptionArg.NONE,
+            _("Print how long it takes to start"),
+            None,
+        )
+        self.add_main_option(
+            "profile-memory",
+            0,
+            GLib.OptionFlags.NONE,
+            GLib.OptionArg.NONE,
+            _("Print how much memory actions allocate and keep"),
+            None,
+        )
+        self.add_main_option(
+            "trace",
+            0,
+            GLib.OptionFlags.NONE,
+            GLib.OptionArg.FILENAME,
+            _("Record runs to a Chrome trace file"),
+            _("FILE"),
+        )
+        self.add_main_option(
+            "service",
+            0,
+            GLib.OptionFlags.NONE,
+            GLib.OptionArg.NONE,
+            _("Run saved workflows when asked to over D-Bus, without a window"),
+            None,
+        )
+
+    def do_handle_local_options(  # pylint: disable=arguments-differ
+        self, options: GLib.VariantDict
+    ) -> int:
+        if options.contains("profile-startup"):
+            startup.enabled = True
+
+        if options.contains("profile-memory"):
+            memory.enable()
+
+        if trace_path := options.lookup_value("trace"):
+            tracing.enable(Path(os.fsdecode(trace_path.get_bytestring())))
+
+        if options.contains("service"):
+            self.service_mode = True
+            self._skip_activate = True
+            self.hold()
+
+        return -1
+
+    def do_dbus_register(  # pylint: disable=arguments-differ
+        self, connection: Gio.DBusConnection, object_path: str
+    ) -> bool:
+        if not Adw.Application.do_dbus_register(self, connection, object_path):
+            return False
+
+        if not self.service_mode:
+            return True
+
+        # Imported here so that starting the app normally doesn't have to
+        from actions.service import (  # pylint: disable=import-outside-toplevel
+            WorkflowService,
+        )
+
+        self.service = WorkflowService(connection, object_path + "/Workflows", self)
+        self.service.load_directory(
+            Path(GLib.get_user_data_dir(), "actions", "workflows")
+        )
+        self.service.register()
+
+        return True
+
+    def do_dbus_unregister(  # pylint: disable=arguments-differ
+        self, connection: Gio.DBusConnection, object_path: str
+    ) -> None:
+        if self.service:
+            self.service.unregister()
+            self.service = None
+
+        Adw.Application.do_dbus_unregister(self, connection, object_path)
+
+    def do_shutdown(self) -> None:
+        # Quitting doesn't close windows, so write their pending edits to be recovered
+        for window in self.get_windows():
+            if autosave := getattr(window, "autosave", None):
+                autosave.flush()
+
+        Adw.Application.do_shutdown(self)
 
     def do_activate(  # pylint: disable=arguments-differ
         self, gfile: Optional[Gio.File] = None
@@ -67,10 +178,25 @@ class ActionsApplication(Adw.Application):
         necessary.
         """
 
+        if self._skip_activate:
+            # Launching the app while the service runs still opens a window
+            self._skip_activate = False
+            return
+
         if self.get_active_window():
             return
 
-        ActionsWindow(application=self).present()
+        startup.mark("activate")
+
+        # Imported here so that e.g. `--help` doesn't have to load every action
+        from actions.window import (  # pylint: disable=import-outside-toplevel
+            ActionsWindow,
+        )
+
+        (window := ActionsWindow(application=self)).present()
+
+        startup.mark("present")
+        startup.watch_first_frame(window)
 
     def on_about_action(self, *_args: Any):
         """Callback for the app.about action."""
@@ -102,5 +228,11 @@ class ActionsApplication(Adw.Application):
 
 def main():
     """The application's entry point."""
+    if sys.argv[1:2] == ["run"]:
+        # Imported here so that starting the app doesn't have to
+        from actions import batch  # pylint: disable=import-outside-toplevel
+
+        return batch.main(sys.argv[2:])
+
     app = ActionsApplication()
     return app.run(sys.argv)
@@ -0,0 +1,185 @@
+# memory.py
+#
+# Copyright 2024 kramo
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+"""Measuring how much memory actions and editing allocate and keep."""
+
+import atexit
+import os
+import sys
+import tracemalloc
+from collections import Counter
+from contextlib import contextmanager, nullcontext
+from typing import Any, Callable, ContextManager, Iterator, Optional
+
+# Enabled with the `--profile-memory` option or this environment variable
+enabled = False
+
+# Frames kept for each allocation, more is slower but shows more than the last caller
+FRAMES = 8
+
+_filters = (
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, __file__),
+)
+
+
+class Measurement:
+    """The memory allocated by one measured call, in bytes."""
+
+    # The most that was allocated at once and what was still allocated after
+    peak: int = 0
+    retained: int = 0
+
+    def __init__(self, kind: str, ident: str) -> None:
+        self.kind = kind
+        self.ident = ident
+
+        # The biggest retained allocations, by the line they were made on
+        self.sites: list[tuple[str, int]] = []
+
+
+class Stats:
+    """The measurements of everything with the same kind and ident, added up."""
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.peak = 0
+        self.retained = 0
+        self.sites: Counter[str] = Counter()
+
+    def add(self, measurement: Measurement) -> None:
+        """Adds `measurement` to the totals."""
+        self.count += 1
+        self.peak = max(self.peak, measurement.peak)
+        self.retained += measurement.retained
+        self.sites.update(dict(measurement.sites))
+
+
+# By kind and ident, like ("action", "wait") or ("add_action", "notification")
+stats: dict[tuple[str, str], Stats] = {}
+
+# The start and the highest peak of each measurement in progress, innermost last
+_stack: list[list[int]] = []
+
+
+def enable() -> None:
+    """Starts measuring actions and editing, and reports on exit."""
+    global enabled  # pylint: disable=global-statement
+
+    if enabled:
+        return
+
+    enabled = True
+
+    if not tracemalloc.is_tracing():
+        tracemalloc.start(FRAMES)
+
+    atexit.register(report)
+
+
+@contextmanager
+def measure(kind: str, ident: str, sites: int = 5) -> Iterator[Measurement]:
+    """
+    Measures the memory allocated in the block and adds it to `stats`.
+
+    The `Measurement` is filled in once the block is done, so it can be used
+    to check for memory budgets. Up to `sites` retained allocations are kept.
+
+    Measurements can be nested, the outer ones include the inner ones.
+    """
+    measurement = Measurement(kind, ident)
+    started = not tracemalloc.is_tracing()
+
+    if started:
+        tracemalloc.start(FRAMES)
+
+    # The peak is reset below, so keep the one of the outer measurement
+    if _stack:
+        _stack[-1][1] = max(_stack[-1][1], tracemalloc.get_traced_memory()[1])
+
+    before = tracemalloc.take_snapshot().filter_traces(_filters) if sites else None
+
+    tracemalloc.reset_peak()
+    current = tracemalloc.get_traced_memory()[0]
+    frame = [current, current]
+    _stack.append(frame)
+
+    try:
+        yield measurement
+    finally:
+        current, peak = tracemalloc.get_traced_memory()
+        _stack.pop()
+
+        frame[1] = max(frame[1], peak)
+        measurement.peak = frame[1] - frame[0]
+        measurement.retained = current - frame[0]
+
+        if _stack:
+            _stack[-1][1] = max(_stack[-1][1], frame[1])
+
+        if before is not None:
+            after = tracemalloc.take_snapshot().filter_traces(_filters)
+            measurement.sites = [
+                (str(diff.traceback[0]), diff.size_diff)
+                for diff in after.compare_to(before, "lineno")[:sites]
+                if diff.size_diff > 0
+            ]
+
+        if started:
+            tracemalloc.stop()
+
+        stats.setdefault((kind, ident), Stats()).add(measurement)
+
+
+def track(kind: str, ident: str) -> ContextManager[Optional[Measurement]]:
+    """Measures the block like `measure()` if profiling is enabled."""
+    return measure(kind, ident) if enabled else nullcontext()
+
+
+def wrap(ident: str, func: Callable[..., Any]) -> Callable[..., Any]:
+    """
+    Wraps the action function `func` so each call is measured as an "action".
+
+    Asynchronous actions are only measured until their function returns.
+    """
+
+    def measured(*args: Any) -> Any:
+        with measure("action", ident):
+            return func(*args)
+
+    return measured
+
+
+def report(limit: int = 3) -> None:
+    """Prints the totals in `stats` to stderr, with up to `limit` sites each."""
+    for (kind, ident), total in sorted(
+        stats.items(), key=lambda item: item[1].retained, reverse=True
+    ):
+        print(
+            f"memory: {kind} {ident}: {total.count} calls, "
+            f"peak {total.peak} B, retained {total.retained} B",
+            file=sys.stderr,
+        )
+
+        for site, size in total.sites.most_common(limit):
+            print(f"memory:     {site}: {size} B", file=sys.stderr)
+
+
+if os.environ.get("ACTIONS_PROFILE_MEMORY"):
+    enable()
@@ -0,0 +1,252 @@
+# registry.py
+#
+# Copyright 2024 kramo
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+"""Discovering actions from plugins without importing them."""
+
+import importlib
+import importlib.util
+import json
+import logging
+import sys
+from importlib.metadata import entry_points
+from pathlib import Path
+from typing import Any, Iterable, NamedTuple, Optional, Type
+
+from gi.repository import GLib
+
+from actions.actions import Action, groups
+
+ENTRY_POINT_GROUP = "actions.plugins"
+INDEX_VERSION = 1
+
+
+class ActionInfo(NamedTuple):
+    """
+    Metadata about an action that is enough to show it without importing it.
+
+    `module` is either an importable module name or the path to a Python file,
+    `attr` is the name of the `Action` subclass in it.
+    """
+
+    ident: str
+    title: str
+    icon_name: str
+    doc: str
+    type: Optional[str]
+    group: str
+    module: str
+    attr: str
+
+    @classmethod
+    def from_action(cls, action: Type[Action], group: str, module: str) -> "ActionInfo":
+        """Gets the info for the `action` class in `group`, defined in `module`."""
+        return cls(
+            action.ident,
+            action.title,
+            action.icon_name,
+            getattr(action, "doc", ""),
+            action.type.__name__ if action.type else None,
+            group,
+            module,
+            action.__name__,
+        )
+
+
+class Registry:
+    """
+    Keeps track of built-in actions and ones from plugins.
+
+    Plugins are Python modules registered under the `actions.plugins` entry point group
+    or Python files in the `plugins` directory. They define a tuple of `Action`
+    subclasses called `actions` and optionally the title of their `group`.
+
+    Metadata of plugins is kept in an index on disk that is only updated
+    when a plugin changes, so plugins are only imported once one of their
+    actions is used.
+    """
+
+    _infos: Optional[dict[str, ActionInfo]] = None
+
+    def __init__(
+        self,
+        plugins_dir: Optional[Path] = None,
+        index_path: Optional[Path] = None,
+    ) -> None:
+        self.plugins_dir = plugins_dir or (
+            Path(GLib.get_user_data_dir()) / "actions" / "plugins"
+        )
+        self.index_path = index_path or (
+            Path(GLib.get_user_cache_dir()) / "actions" / "plugins.json"
+        )
+
+        self._classes = {
+            action.ident: action for actions in groups.values() for action in actions
+        }
+
+    @property
+    def infos(self) -> dict[str, ActionInfo]:
+        """Info about all available actions by their ident."""
+        if self._infos is None:
+            self._infos = {
+                action.ident: ActionInfo.from_action(action, title, action.__module__)
+                for title, actions in groups.items()
+                for action in actions
+            }
+
+            for info in self._load_plugin_infos():
+                self._infos.setdefault(info.ident, info)
+
+        return self._infos
+
+    def get_groups(self) -> dict[str, list[ActionInfo]]:
+        """Gets info about all available actions by the title of their group."""
+        by_group = {}
+
+        for info in self.infos.values():
+            by_group.setdefault(info.group, []).append(info)
+
+        return by_group
+
+    def get_action_class(self, ident: str) -> Type[Action]:
+        """Gets the `Action` subclass for `ident`, importing its plugin if needed."""
+        if action := self._classes.get(ident):
+            return action
+
+        try:
+            info = self.infos[ident]
+        except KeyError as error:
+            raise ValueError(f"Unknown action: {ident}") from error
+
+        module = (
+            _import_file(Path(info.module))
+            if info.module.endswith(".py")
+            else importlib.import_module(info.module)
+        )
+
+        self._classes[ident] = action = getattr(module, info.attr)
+        return action
+
+    def refresh(self) -> None:
+        """Discovers plugins again the next time `infos` are needed."""
+        self._infos = None
+
+    def _load_plugin_infos(self) -> list[ActionInfo]:
+        language = GLib.get_language_names()[0]
+
+        try:
+            index = json.loads(self.index_path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            index = {}
+
+        # Titles and docs are translated when the plugin is imported
+        if index.get("version") != INDEX_VERSION or index.get("language") != language:
+            index = {}
+
+        cached = index.get("sources", {})
+        sources = {}
+
+        for key, stamp, load in self._discover():
+            if (entry := cached.get(key)) and entry["stamp"] == stamp:
+                sources[key] = entry
+                continue
+
+            try:
+                sources[key] = {
+                    "stamp": stamp,
+                    "actions": [list(info) for info in load()],
+                }
+            except Exception:  # pylint: disable=broad-exception-caught
+                logging.exception("Cannot load plugin %s", key)
+
+        if sources != cached:
+            try:
+                self.index_path.parent.mkdir(parents=True, exist_ok=True)
+                self.index_path.write_text(
+                    json.dumps(
+                        {
+                            "version": INDEX_VERSION,
+                            "language": language,
+                            "sources": sources,
+                        }
+                    ),
+                    encoding="utf-8",
+                )
+            except OSError as error:
+                logging.warning("Cannot write plugin index: %s", error)
+
+        return [
+            ActionInfo(*info) for entry in sources.values() for info in entry["actions"]
+        ]
+
+    def _discover(self) -> Iterable[tuple[str, str, Any]]:
+        # Yields a key, a stamp that changes with the plugin and a function to get infos
+        for entry_point in entry_points(group=ENTRY_POINT_GROUP):
+            dist = entry_point.dist
+            yield (
+                f"entry-point:{entry_point.name}",
+                f"{dist.name}=={dist.version}" if dist else entry_point.value,
+                lambda entry_point=entry_point: _get_infos(
+                    entry_point.load(), entry_point.module
+                ),
+            )
+
+        try:
+            paths = sorted(self.plugins_dir.glob("*.py"))
+        except OSError:
+            paths = []
+
+        for path in paths:
+            try:
+                stamp = str(path.stat().st_mtime_ns)
+            except OSError:
+                continue
+
+            yield (
+                f"file:{path}",
+                stamp,
+                lambda path=path: _get_infos(_import_file(path), str(path)),
+            )
+
+
+def _get_infos(module: Any, name: str) -> list[ActionInfo]:
+    group = getattr(module, "group", None) or _("Plugins")
+
+    return [ActionInfo.from_action(action, group, name) for action in module.actions]
+
+
+def _import_file(path: Path) -> Any:
+    name = f"actions_plugins.{path.stem}"
+
+    if module := sys.modules.get(name):
+        return module
+
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+
+    try:
+        spec.loader.exec_module(module)
+    except BaseException:
+        del sys.modules[name]
+        raise
+
+    return module
+
+
+registry = Registry()
@@ -0,0 +1,334 @@
+# scheduler.py
+#
+# Copyright 2024 kramo
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+"""Starting things at times or intervals from a single timer."""
+
+import heapq
+import logging
+import math
+import time
+from datetime import datetime, timedelta
+from enum import Enum
+from itertools import count
+from typing import Callable, Optional
+
+from gi.repository import GLib
+
+# The longest the scheduler sleeps for, so changes to the clock are noticed
+MAX_DELAY = 60
+
+
+class Misfire(Enum):
+    """What to do when a schedule is woken up after its grace time has passed."""
+
+    SKIP = "skip"  # Don't fire, only schedule the next time
+    ONCE = "once"  # Fire once, no matter how many times were missed
+
+
+class Trigger:
+    """When a schedule should fire."""
+
+    def get_next(self, after: float) -> Optional[float]:
+        """
+        Gets the first time after `after` to fire at, or None to stop firing.
+
+        Times are in seconds since the epoch.
+        """
+        raise NotImplementedError
+
+
+class IntervalTrigger(Trigger):
+    """Fires every `seconds`, counting from `start` or one interval from now."""
+
+    def __init__(self, seconds: float, start: Optional[float] = None) -> None:
+        if not math.isfinite(seconds) or seconds <= 0:
+            raise ValueError(f"Interval must be positive and finite, not {seconds}")
+
+        self.seconds = seconds
+        self.start = time.time() + seconds if start is None else start
+
+    def get_next(self, after: float) -> Optional[float]:
+        if after < self.start:
+            return self.start
+
+        periods = math.floor((after - self.start) / self.seconds) + 1
+        return self.start + periods * self.seconds
+
+
+class CronTrigger(Trigger):
+    """
+    Fires at the local times matching a crontab expression,
+    like `*/15 9-17 * * 1-5`.
+
+    The fields are minute, hour, day of the month, month and day of the week,
+    where 0 and 7 are Sunday.
+    """
+
+    _ranges = ((0, 59), (0, 23), (1, 31), (1, 12), (0, 7))
+
+    def __init__(self, expression: str) -> None:
+        if len(fields := expression.split()) != 5:
+            raise ValueError(f"Expected 5 fields in {expression!r}")
+
+        self.minutes, self.hours, self.days, self.months, weekdays = (
+            _parse_field(field, low, high)
+            for field, (low, high) in zip(fields, self._ranges)
+        )
+        self.weekdays = frozenset(weekday % 7 for weekday in weekdays)
+
+        # If both days are restricted, either one matching is enough
+        self.either_day = (fields[2] != "*") and (fields[4] != "*")
+
+    def get_next(self, after: float) -> Optional[float]:
+        moment = datetime.fromtimestamp(after).replace(second=0, microsecond=0)
+        moment += timedelta(minutes=1)
+
+        # Long enough to find the next 29th of February
+        limit = moment.year + 8
+
+        while moment.year <= limit:
+            if moment.month not in self.months:
+                moment = (moment.replace(day=28) + timedelta(days=4)).replace(
+                    day=1, hour=0, minute=0
+                )
+            elif not self._matches_day(moment):
+                moment = moment.replace(hour=0, minute=0) + timedelta(days=1)
+            elif moment.hour not in self.hours:
+                moment = moment.replace(minute=0) + timedelta(hours=1)
+            elif moment.minute not in self.minutes:
+                moment += timedelta(minutes=1)
+            else:
+                return moment.timestamp()
+
+        return None
+
+    def _matches_day(self, moment: datetime) -> bool:
+        day = moment.day in self.days
+        weekday = (moment.weekday() + 1) % 7 in self.weekdays
+
+        return (day or weekday) if self.either_day else (day and weekday)
+
+
+def _parse_field(field: str, low: int, high: int) -> frozenset[int]:
+    values = set()
+
+    for part in field.split(","):
+        part, _sep, step = part.partition("/")
+
+        try:
+            step = int(step) if step else 1
+
+            if part == "*":
+                start, end = low, high
+            elif "-" in part:
+                start, end = (int(value) for value in part.split("-", 1))
+            else:
+                start = int(part)
+                end = high if step > 1 else start
+        except ValueError as error:
+            raise ValueError(f"Invalid cron field {field!r}") from error
+
+        if step < 1 or not low <= start <= end <= high:
+            raise ValueError(f"Invalid cron field {field!r}")
+
+        values.update(range(start, end + 1, step))
+
+    return frozenset(values)
+
+
+def parse_trigger(text: str) -> Trigger:
+    """Parses a crontab expression or a number of seconds to repeat after."""
+    if len(text.split()) == 5:
+        return CronTrigger(text)
+
+    try:
+        return IntervalTrigger(float(text))
+    except ValueError as error:
+        raise ValueError(f"Invalid trigger {text!r}") from error
+
+
+class Schedule:
+    """Calls `callback` whenever `trigger` fires, see `Scheduler.add()`."""
+
+    # None when it is not waiting in the queue
+    next_time: Optional[float] = None
+    cancelled: bool = False
+
+    def __init__(
+        self,
+        scheduler: "Scheduler",
+        trigger: Trigger,
+        callback: Callable[[], None],
+        misfire: Misfire,
+        grace: float,
+    ) -> None:
+        self.scheduler = scheduler
+        self.trigger = trigger
+        self.callback = callback
+        self.misfire = misfire
+        self.grace = grace
+
+    def cancel(self) -> None:
+        """Stops the schedule from firing again."""
+        self.scheduler.remove(self)
+
+
+class Scheduler:
+    """
+    Keeps every schedule in one heap ordered by when it fires next,
+    with a single GLib timeout armed for the earliest one.
+
+    Schedules due within `window` seconds of each other are fired in the same
+    wakeup, and a schedule that missed several times only fires once,
+    so thousands of schedules cost nothing until one of them is due.
+    """
+
+    _source_id: int = 0
+    _armed: Optional[float] = None
+
+    def __init__(
+        self, window: float = 0.05, clock: Callable[[], float] = time.time
+    ) -> None:
+        self.window = window
+        self.clock = clock
+
+        self._heap: list[tuple[float, int, Schedule]] = []
+        self._order = count()
+        self._cancelled = 0
+
+    def __len__(self) -> int:
+        return len(self._heap) - self._cancelled
+
+    def add(
+        self,
+        trigger: Trigger,
+        callback: Callable[[], None],
+        misfire: Misfire = Misfire.ONCE,
+        grace: float = 1.0,
+    ) -> Schedule:
+        """
+        Calls `callback` on the main loop whenever `trigger` fires.
+
+        If the scheduler is woken up more than `grace` seconds late,
+        for example after a suspend, `misfire` decides whether it still fires.
+        """
+        schedule = Schedule(self, trigger, callback, misfire, grace)
+        self._push(schedule, trigger.get_next(self.clock()))
+        self._arm()
+
+        return schedule
+
+    def remove(self, schedule: Schedule) -> None:
+        """Stops `schedule` from firing again."""
+        if schedule.cancelled:
+            return
+
+        schedule.cancelled = True
+
+        if schedule.next_time is None:
+            return
+
+        # Removing from the middle of the heap is slow, so it is skipped when popped
+        self._cancelled += 1
+
+        if self._cancelled > len(self._heap) // 2:
+            self._heap = [entry for entry in self._heap if not entry[2].cancelled]
+            heapq.heapify(self._heap)
+            self._cancelled = 0
+
+        self._arm()
+
+    def clear(self) -> None:
+        """Removes every schedule."""
+        for _time, _order, schedule in self._heap:
+            schedule.cancelled = True
+            schedule.next_time = None
+
+        self._heap.clear()
+        self._cancelled = 0
+        self._arm()
+
+    def _push(self, schedule: Schedule, next_time: Optional[float]) -> None:
+        schedule.next_time = next_time
+
+        if (next_time is not None) and (not schedule.cancelled):
+            heapq.heappush(self._heap, (next_time, next(self._order), schedule))
+
+    def _arm(self) -> None:
+        heap = self._heap
+
+        while heap and heap[0][2].cancelled:
+            heapq.heappop(heap)
+            self._cancelled -= 1
+
+        if not heap:
+            if self._source_id:
+                GLib.source_remove(self._source_id)
+                self._source_id = 0
+                self._armed = None
+            return
+
+        next_time = heap[0][0]
+
+        # Waking up too early is fine, the timeout arms itself again
+        if self._source_id and (self._armed <= next_time):
+            return
+
+        if self._source_id:
+            GLib.source_remove(self._source_id)
+
+        delay = min(max(next_time - self.clock(), 0), MAX_DELAY)
+
+        self._armed = next_time
+        self._source_id = GLib.timeout_add(math.ceil(delay * 1000), self._on_timeout)
+
+    def _on_timeout(self) -> bool:
+        self._source_id = 0
+        self._armed = None
+
+        now = self.clock()
+        heap = self._heap
+        due = []
+
+        while heap and (heap[0][0] <= now + self.window):
+            next_time, _order, schedule = heapq.heappop(heap)
+
+            if schedule.cancelled:
+                self._cancelled -= 1
+                continue
+
+            schedule.next_time = None
+            due.append((next_time, schedule))
+
+        for next_time, schedule in due:
+            # Times missed in between are skipped over
+            following = schedule.trigger.get_next(max(now, next_time))
+
+            if (now - next_time <= schedule.grace) or (
+                schedule.misfire == Misfire.ONCE
+            ):
+                try:
+                    schedule.callback()
+                except Exception:  # pylint: disable=broad-exception-caught
+                    logging.exception("Scheduled callback failed")
+
+            self._push(schedule, following)
+
+        self._arm()
+        return False
@@ -0,0 +1,292 @@
+# service.py
+#
+# Copyright 2024 kramo
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+"""Running workflows kept in memory when asked to over D-Bus."""
+
+import logging
+from itertools import count
+from pathlib import Path
+from typing import Any, Optional
+
+from gi.repository import Gio, GLib, Gtk
+
+from actions.engine import Executor, Workflow
+from actions.scheduler import Schedule, Scheduler, Trigger, parse_trigger
+from actions.storage import load_file
+
+INTERFACE = "page.kramo.Actions.Workflows"
+
+_node_info = Gio.DBusNodeInfo.new_for_xml(
+    f"""
+<node>
+  <interface name="{INTERFACE}">
+    <method name="Run">
+      <arg name="name" type="s" direction="in"/>
+      <arg name="inputs" type="a{{ua{{sv}}}}" direction="in"/>
+      <arg name="run_id" type="t" direction="out"/>
+    </method>
+    <method name="ListWorkflows">
+      <arg name="names" type="as" direction="out"/>
+    </method>
+    <method name="Cancel">
+      <arg name="run_id" type="t" direction="in"/>
+      <arg name="cancelled" type="b" direction="out"/>
+    </method>
+    <method name="Schedule">
+      <arg name="name" type="s" direction="in"/>
+      <arg name="trigger" type="s" direction="in"/>
+      <arg name="schedule_id" type="t" direction="out"/>
+    </method>
+    <method name="Unschedule">
+      <arg name="schedule_id" type="t" direction="in"/>
+      <arg name="removed" type="b" direction="out"/>
+    </method>
+    <signal name="RunFinished">
+      <arg name="run_id" type="t"/>
+    </signal>
+  </interface>
+</node>
+"""
+)
+
+
+def _is_same_type(value: Any, default: Any) -> bool:
+    # Props without a value yet are text, like in entry rows
+    if default is None:
+        return isinstance(value, str)
+
+    if isinstance(default, (int, float)) and not isinstance(default, bool):
+        return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+    return isinstance(value, type(default))
+
+
+class WorkflowService:
+    """
+    Exports `workflows` on `connection`, compiled once and kept for every run.
+
+    `Run` takes the name of a workflow and props overriding those of
+    the action at each index, see `RunContext`.
+    It returns an ID to pass to `Cancel` that is also sent with `RunFinished`.
+
+    `Schedule` runs a workflow whenever a trigger fires, see `parse_trigger()`.
+
+    Nothing is registered until `register()` is called, so the service
+    can be exported on any connection, like one to a private bus.
+    """
+
+    registration_id: int = 0
+
+    def __init__(
+        self,
+        connection: Gio.DBusConnection,
+        object_path: str,
+        app: Optional[Gtk.Application] = None,
+    ) -> None:
+        self.connection = connection
+        self.object_path = object_path
+        self.app = app
+
+        self.workflows: dict[str, Workflow] = {}
+        self.runs: dict[int, Executor] = {}
+        self._run_ids = count(1)
+
+        self.scheduler = Scheduler()
+        self.schedules: dict[int, Schedule] = {}
+        self._schedule_ids = count(1)
+
+    def register(self) -> None:
+        """Exports the service on its connection."""
+        # Only in the bindings since GLib 2.84, before that
+        # `register_object()` takes the callbacks directly
+        register = getattr(
+            self.connection,
+            "register_object_with_closures",
+            self.connection.register_object,
+        )
+        self.registration_id = register(
+            self.object_path,
+            _node_info.interfaces[0],
+            self._on_method_call,
+            None,
+            None,
+        )
+
+    def unregister(self) -> None:
+        """Stops exporting the service and cancels all runs and schedules."""
+        self.scheduler.clear()
+        self.schedules.clear()
+
+        for executor in tuple(self.runs.values()):
+            executor.cancel()
+
+        if self.registration_id:
+            self.connection.unregister_object(self.registration_id)
+            self.registration_id = 0
+
+    def add_workflow(self, name: str, workflow: Workflow) -> None:
+        """Makes `workflow` available to run as `name`."""
+        self.workflows[name] = workflow
+
+    def load_directory(self, directory: Path) -> None:
+        """Loads every workflow file in `directory`, named after the file."""
+        for path in sorted(directory.glob("*.workflow")):
+            try:
+                self.add_workflow(path.stem, Workflow(load_file(path), self.app))
+            except (OSError, ValueError, KeyError) as error:
+                logging.warning("Cannot load workflow %s: %s", path, error)
+
+    def run(self, name: str, inputs: Optional[dict[int, dict]] = None) -> int:
+        """
+        Starts a run of the workflow called `name` and returns its ID.
+
+        Raises `KeyError` for an unknown workflow, `IndexError` for inputs
+        of an action it doesn't have and `ValueError` for inputs of the wrong type.
+        """
+        workflow, run_id = self._prepare(name, inputs)
+        self._start(run_id, workflow, inputs)
+        return run_id
+
+    def cancel(self, run_id: int) -> bool:
+        """Cancels the run with `run_id`, returning False if it is not running."""
+        if not (executor := self.runs.get(run_id)):
+            return False
+
+        executor.cancel()
+        return True
+
+    def schedule(self, name: str, trigger: Trigger) -> int:
+        """Runs the workflow called `name` whenever `trigger` fires and returns an ID."""
+        if name not in self.workflows:
+            raise KeyError(name)
+
+        schedule_id = next(self._schedule_ids)
+        self.schedules[schedule_id] = self.scheduler.add(
+            trigger, lambda: self.run(name)
+        )
+
+        return schedule_id
+
+    def unschedule(self, schedule_id: int) -> bool:
+        """Removes the schedule with `schedule_id`, returning False if there is none."""
+        if not (schedule := self.schedules.pop(schedule_id, None)):
+            return False
+
+        schedule.cancel()
+        return True
+
+    def _prepare(
+        self, name: str, inputs: Optional[dict[int, dict]]
+    ) -> tuple[Workflow, int]:
+        workflow = self.workflows[name]
+
+        for index, props in (inputs or {}).items():
+            if not 0 <= index < len(workflow.actions):
+                raise IndexError(f"Workflow {name!r} has no action {index}")
+
+            action_props = workflow.actions[index].props
+
+            for key, value in props.items():
+                if key not in action_props:
+                    raise ValueError(f"Action {index} of {name!r} has no prop {key!r}")
+
+                if not _is_same_type(value, action_props[key]):
+                    raise ValueError(
+                        f"Prop {key!r} of action {index} of {name!r} "
+                        f"can't be {type(value).__name__}"
+                    )
+
+        return workflow, next(self._run_ids)
+
+    def _start(
+        self, run_id: int, workflow: Workflow, inputs: Optional[dict[int, dict]]
+    ) -> None:
+        executor = workflow.run(lambda: self._on_run_finished(run_id), inputs)
+
+        if not executor.finished:
+            self.runs[run_id] = executor
+
+    def _on_run_finished(self, run_id: int) -> None:
+        self.runs.pop(run_id, None)
+
+        self.connection.emit_signal(
+            None,
+            self.object_path,
+            INTERFACE,
+            "RunFinished",
+            GLib.Variant("(t)", (run_id,)),
+        )
+
+    def _on_method_call(  # pylint: disable=too-many-arguments
+        self,
+        _connection: Gio.DBusConnection,
+        _sender: str,
+        _object_path: str,
+        _interface_name: str,
+        method_name: str,
+        parameters: GLib.Variant,
+        invocation: Gio.DBusMethodInvocation,
+    ) -> None:
+        args: Any = parameters.unpack()
+
+        match method_name:
+            case "Run":
+                name, inputs = args
+
+                try:
+                    workflow, run_id = self._prepare(name, inputs)
+                except KeyError:
+                    self._return_unknown(invocation, name)
+                    return
+                except (IndexError, ValueError) as error:
+                    invocation.return_error_literal(
+                        Gio.dbus_error_quark(), Gio.DBusError.INVALID_ARGS, str(error)
+                    )
+                    return
+
+                # Reply before running, so the ID arrives before `RunFinished`
+                invocation.return_value(GLib.Variant("(t)", (run_id,)))
+                self._start(run_id, workflow, inputs)
+            case "ListWorkflows":
+                invocation.return_value(GLib.Variant("(as)", (sorted(self.workflows),)))
+            case "Cancel":
+                invocation.return_value(GLib.Variant("(b)", (self.cancel(*args),)))
+            case "Schedule":
+                name, trigger = args
+
+                if name not in self.workflows:
+                    self._return_unknown(invocation, name)
+                    return
+
+                try:
+                    schedule_id = self.schedule(name, parse_trigger(trigger))
+                except ValueError as error:
+                    invocation.return_error_literal(
+                        Gio.dbus_error_quark(), Gio.DBusError.INVALID_ARGS, str(error)
+                    )
+                    return
+
+                invocation.return_value(GLib.Variant("(t)", (schedule_id,)))
+            case "Unschedule":
+                invocation.return_value(GLib.Variant("(b)", (self.unschedule(*args),)))
+
+    def _return_unknown(self, invocation: Gio.DBusMethodInvocation, name: str) -> None:
+        invocation.return_dbus_error(
+            f"{INTERFACE}.Error.UnknownWorkflow", f"No workflow called {name!r}"
+        )
@@ -0,0 +1,86 @@
+# startup.py
+#
+# Copyright 2024 kramo
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+"""Measuring how long it takes for the app to start."""
+
+import os
+import sys
+import time
+from typing import Any, Callable, Optional
+
+# Enabled with the `--profile-startup` option or this environment variable
+enabled = bool(os.environ.get("ACTIONS_PROFILE_STARTUP"))
+
+marks: dict[str, float] = {}
+
+
+def _get_process_start() -> float:
+    # The time the process was started at in terms of `time.perf_counter()`
+    now = time.perf_counter()
+
+    try:
+        with open("/proc/self/stat", encoding="utf-8") as stat:
+            # The command name can contain spaces, the fields after it can't
+            fields = stat.read().rsplit(")", 1)[1].split()
+
+        started = int(fields[19]) / os.sysconf("SC_CLK_TCK")
+        age = time.clock_gettime(time.CLOCK_BOOTTIME) - started
+    except (OSError, IndexError, ValueError, AttributeError):
+        return now
+
+    return now - max(age, 0.0)
+
+
+process_start = _get_process_start()
+
+
+def mark(name: str) -> None:
+    """Records the time since the process was started as `name`."""
+    if not enabled:
+        return
+
+    marks[name] = time.perf_counter() - process_start
+
+
+def report() -> None:
+    """Prints all recorded times to stderr."""
+    for name, seconds in marks.items():
+        print(f"startup: {name}: {seconds * 1000:.1f} ms", file=sys.stderr)
+
+
+def watch_first_frame(widget: Any, cb: Optional[Callable] = None) -> None:
+    """
+    Marks `first-frame` and reports when `widget` is first painted.
+
+    `widget` must be realized.
+    """
+    if not enabled or not (frame_clock := widget.get_frame_clock()):
+        return
+
+    handler = 0
+
+    def after_paint(*_args: Any) -> None:
+        frame_clock.disconnect(handler)
+        mark("first-frame")
+        report()
+
+        if cb:
+            cb()
+
+    handler = frame_clock.connect("after-paint", after_paint)
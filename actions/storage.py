@@ -0,0 +1,142 @@
+# storage.py
+#
+# Copyright 2024 kramo
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+"""Saving and loading workflows."""
+
+import json
+import os
+from pathlib import Path
+from typing import IO, Iterable, Sequence
+
+from actions.engine import ActionSpec
+from actions.variables import VariableProperties
+
+FORMAT = "page.kramo.Actions.Workflow"
+VERSION = 1
+
+_separators = (",", ":")
+
+
+def get_specs(actions: Sequence[VariableProperties]) -> list[ActionSpec]:
+    """Gets `ActionSpec`s for `actions`, with their sources as bindings by index."""
+    indices = {action: index for index, action in enumerate(actions)}
+
+    return [
+        ActionSpec(
+            action.ident,
+            dict(action.props),
+            {key: indices[source] for key, source in action.sources.items()},
+        )
+        for action in actions
+    ]
+
+
+def dump(specs: Iterable[ActionSpec], file: IO[str]) -> None:
+    """
+    Writes `specs` to `file` as JSON lines.
+
+    The first line is a header with the format and version,
+    followed by one `[ident, props, bindings]` array per action.
+    """
+    file.write(
+        json.dumps({"format": FORMAT, "version": VERSION}, separators=_separators)
+    )
+    file.write("\n")
+
+    for spec in specs:
+        file.write(
+            json.dumps(
+                [spec.ident, spec.props or {}, spec.bindings or {}],
+                separators=_separators,
+            )
+        )
+        file.write("\n")
+
+
+def load(file: IO[str]) -> list[ActionSpec]:
+    """
+    Reads `ActionSpec`s written by `dump()` from `file`.
+
+    Raises `ValueError` if `file` is not a workflow in a supported version
+    or one of its actions is malformed.
+    """
+    try:
+        header = json.loads(file.readline())
+    except ValueError as error:
+        raise ValueError("Not a workflow") from error
+
+    if not isinstance(header, dict) or header.get("format") != FORMAT:
+        raise ValueError("Not a workflow")
+
+    if header.get("version") != VERSION:
+        raise ValueError(f"Unsupported workflow version: {header.get('version')}")
+
+    specs = []
+
+    for number, line in enumerate(file, 2):
+        if not line.strip():
+            continue
+
+        try:
+            specs.append(_load_action(line))
+        except ValueError as error:
+            raise ValueError(f"Invalid action on line {number}") from error
+
+    return specs
+
+
+def _load_action(line: str) -> ActionSpec:
+    record = json.loads(line)
+
+    if not isinstance(record, list) or len(record) != 3:
+        raise ValueError("Expected an [ident, props, bindings] array")
+
+    ident, props, bindings = record
+
+    if not isinstance(ident, str):
+        raise ValueError("The ident must be a string")
+
+    if not isinstance(props, dict) or not isinstance(bindings, dict):
+        raise ValueError("Props and bindings must be objects")
+
+    if not all(
+        isinstance(source, int) and not isinstance(source, bool)
+        for source in bindings.values()
+    ):
+        raise ValueError("Bindings must be action indices")
+
+    return ActionSpec(ident, props, bindings)
+
+
+def save_file(path: Path, specs: Iterable[ActionSpec]) -> None:
+    """Writes `specs` to `path`, replacing it only once everything is written."""
+    temp_path = path.with_name(f".{path.name}.tmp")
+
+    with temp_path.open("w", encoding="utf-8") as file:
+        dump(specs, file)
+        file.flush()
+        os.fsync(file.fileno())
+
+    os.replace(temp_path, path)
+
+
+def load_file(path: Path) -> list[ActionSpec]:
+    """Reads `ActionSpec`s from the file at `path`."""
+    with path.open(encoding="utf-8") as file:
+        return load(file)
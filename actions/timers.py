@@ -0,0 +1,240 @@
+# timers.py
+#
+# Copyright 2024 kramo
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+"""Timeouts with millisecond precision that share a single GLib source."""
+
+import logging
+import math
+from typing import Any, Callable, Optional
+
+from gi.repository import GLib
+
+# Each level of the wheel has 64 slots, each as long as all slots on the level below
+BITS = 6
+SLOTS = 1 << BITS
+MASK = SLOTS - 1
+LEVELS = 6
+
+# About 780 days, longer timeouts are clamped to this
+# so timers on the top level never wrap around to the current slot
+MAX_TICKS = (1 << (BITS * LEVELS)) - (1 << (BITS * (LEVELS - 1))) - 1
+
+
+class Timer:
+    """A pending timeout, see `TimerWheel.add()`."""
+
+    __slots__ = ("wheel", "expires", "callback", "args", "slot", "cancelled")
+
+    def __init__(
+        self,
+        wheel: "TimerWheel",
+        expires: int,
+        callback: Callable[..., Any],
+        args: tuple[Any, ...],
+    ) -> None:
+        self.wheel = wheel
+        self.expires = expires
+        self.callback = callback
+        self.args = args
+
+        # The slot of the wheel the timer is in, None if it fired or was cancelled
+        self.slot: Optional[dict["Timer", None]] = None
+
+        # So a timer cancelled by another one due at the same time doesn't fire
+        self.cancelled = False
+
+    @property
+    def pending(self) -> bool:
+        """Whether the timer has neither fired nor been cancelled."""
+        return self.slot is not None
+
+    def cancel(self) -> None:
+        """Stops the timer from firing, if it hasn't already."""
+        self.cancelled = True
+
+        if (slot := self.slot) is not None:
+            slot.pop(self)
+            self.slot = None
+            self.wheel._remove()  # pylint: disable=protected-access
+
+
+class TimerWheel:
+    """
+    A hierarchical timer wheel with a tick of one millisecond.
+
+    Adding and cancelling timers takes constant time, no matter how many there are.
+    A timer is placed on the lowest level whose slots are still in the future
+    and moved down a level when its slot comes up, until it fires.
+
+    A single GLib timeout is armed for the next slot with timers in it,
+    and all timers that are due when it fires are fired together.
+    """
+
+    _source_id: int = 0
+    _armed: Optional[int] = None
+
+    def __init__(self) -> None:
+        self._origin = GLib.get_monotonic_time() // 1000
+        self._tick = 0
+        self._count = 0
+        self._levels = tuple(
+            tuple({} for _slot in range(SLOTS)) for _level in range(LEVELS)
+        )
+
+    def __len__(self) -> int:
+        return self._count
+
+    def add(self, seconds: float, callback: Callable[..., Any], *args: Any) -> Timer:
+        """Calls `callback` with `args` on the main loop after `seconds`."""
+        now = self._now()
+
+        # Nothing can be missed by moving ahead if there are no timers
+        if not self._count:
+            self._tick = now
+
+        timer = Timer(
+            self,
+            min(now + max(math.ceil(seconds * 1000), 0), self._tick + MAX_TICKS),
+            callback,
+            args,
+        )
+
+        if not self._insert(timer):
+            # Due now, but it should still fire on the main loop like any timeout
+            timer.expires += 1
+            self._insert(timer)
+
+        self._count += 1
+
+        if (self._armed is None) or (timer.expires < self._armed):
+            self._arm()
+
+        return timer
+
+    def _remove(self) -> None:
+        self._count -= 1
+
+        if not self._count and self._source_id:
+            GLib.source_remove(self._source_id)
+            self._source_id = 0
+            self._armed = None
+
+    def _now(self) -> int:
+        return GLib.get_monotonic_time() // 1000 - self._origin
+
+    def _insert(self, timer: Timer) -> bool:
+        expires = timer.expires
+        tick = self._tick
+
+        if expires <= tick:
+            return False
+
+        # The lowest level where the timer and the current tick are in the same slot above
+        level = 0
+        while (level < LEVELS - 1) and (
+            (expires >> (BITS * (level + 1))) != (tick >> (BITS * (level + 1)))
+        ):
+            level += 1
+
+        timer.slot = slot = self._levels[level][(expires >> (BITS * level)) & MASK]
+        slot[timer] = None
+
+        return True
+
+    def _get_next(self) -> Optional[int]:
+        tick = self._tick
+
+        for level, slots in enumerate(self._levels):
+            shift = BITS * level
+            current = (tick >> shift) & MASK
+
+            # Timers are always in later slots than the current one,
+            # only the top level wraps around
+            for offset in range(1, SLOTS):
+                if slots[(current + offset) & MASK]:
+                    return ((tick >> shift) + offset) << shift
+
+        return None
+
+    def _advance(self, target: int) -> list[Timer]:
+        due = []
+
+        while ((tick := self._get_next()) is not None) and (tick <= target):
+            self._tick = tick
+
+            # Move timers down from every level whose slot starts now
+            for level in range(LEVELS - 1, 0, -1):
+                shift = BITS * level
+                if tick & ((1 << shift) - 1):
+                    continue
+
+                slot = self._levels[level][(tick >> shift) & MASK]
+                moved = tuple(slot)
+                slot.clear()
+
+                for timer in moved:
+                    if not self._insert(timer):
+                        due.append(timer)
+
+            slot = self._levels[0][tick & MASK]
+            due.extend(slot)
+            slot.clear()
+
+        for timer in due:
+            timer.slot = None
+
+        self._tick = max(self._tick, target)
+        self._count -= len(due)
+        return due
+
+    def _arm(self) -> None:
+        if self._source_id:
+            GLib.source_remove(self._source_id)
+            self._source_id = 0
+
+        self._armed = self._get_next()
+
+        if self._armed is None:
+            return
+
+        self._source_id = GLib.timeout_add(
+            max(self._armed - self._now(), 0), self._on_timeout
+        )
+
+    def _on_timeout(self) -> bool:
+        self._source_id = 0
+        self._armed = None
+
+        for timer in self._advance(self._now()):
+            if timer.cancelled:
+                continue
+
+            try:
+                timer.callback(*timer.args)
+            except Exception:  # pylint: disable=broad-exception-caught
+                logging.exception("Timer callback failed")
+
+        # Callbacks may have added timers and armed a timeout already
+        if not self._source_id:
+            self._arm()
+
+        return False
+
+
+timers = TimerWheel()
@@ -0,0 +1,174 @@
+# tracing.py
+#
+# Copyright 2024 kramo
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+"""Recording where the time goes in runs, as a Chrome trace."""
+
+import atexit
+import json
+import logging
+import os
+import time
+from collections import deque
+from itertools import count
+from pathlib import Path
+from typing import Any, Callable, Optional
+
+# Enabled with the `--trace` option or by setting this environment variable to a path
+path: Optional[Path] = None
+enabled: bool = False
+
+# Old events are dropped so long sessions don't grow without bound
+MAX_EVENTS = 1_000_000
+events: deque[dict] = deque(maxlen=MAX_EVENTS)
+
+_run_ids = count(1)
+_pid = os.getpid()
+
+
+def now() -> float:
+    """The current time in microseconds, like in Chrome traces."""
+    return time.perf_counter() * 1_000_000
+
+
+def enable(trace_path: Optional[Path] = None) -> None:
+    """Starts recording runs, writing them to `trace_path` on exit if it is not None."""
+    global enabled, path  # pylint: disable=global-statement
+
+    if trace_path and not path:
+        atexit.register(lambda: path and export(path))
+
+    enabled = True
+    path = trace_path or path
+
+
+def clear() -> None:
+    """Drops all recorded events."""
+    events.clear()
+
+
+def export(trace_path: Path) -> None:
+    """Writes the recorded events to `trace_path` as Chrome trace JSON."""
+    try:
+        with open(trace_path, "w", encoding="utf-8") as file:
+            json.dump(
+                {"traceEvents": list(events), "displayTimeUnit": "ms"},
+                file,
+            )
+    except OSError as error:
+        logging.warning("Cannot write trace: %s", error)
+
+
+class RunTrace:
+    """
+    Records the spans of a single run.
+
+    Binding props and executing an action are recorded on the thread row
+    of the run, and the time until an action calls back is recorded
+    as an async span, so parallel actions can overlap.
+    """
+
+    def __init__(self, name: str = "run") -> None:
+        self.run_id = next(_run_ids)
+        self.name = name
+
+        # Waits that haven't ended yet, by their IDs
+        self._waiting: dict[str, str] = {}
+
+        self._async(name, "run", "b", self.run_id)
+
+    def span(self, name: str, category: str, start: float, **args: Any) -> None:
+        """Records a span called `name` from `start` until now."""
+        events.append(
+            {
+                "name": name,
+                "cat": category,
+                "ph": "X",
+                "ts": start,
+                "dur": now() - start,
+                "pid": _pid,
+                "tid": self.run_id,
+                "args": args,
+            }
+        )
+
+    def wrap_done(
+        self, index: int, ident: str, done: Callable[..., None]
+    ) -> tuple[Callable[..., None], Callable[[], None]]:
+        """
+        Wraps the `done` callback of the action at `index`.
+
+        Call the second callable when the action function returns,
+        the time from then until `done` is called is recorded as waiting.
+        """
+        returned = False
+        called = False
+        wait_id = f"{self.run_id}:{index}"
+
+        def traced_done(*args: Any) -> None:
+            nonlocal called
+
+            if returned and not called:
+                del self._waiting[wait_id]
+                self._async(ident, "wait", "e", wait_id)
+
+            called = True
+            done(*args)
+
+        def action_returned() -> None:
+            nonlocal returned
+            returned = True
+
+            if not called:
+                self._waiting[wait_id] = ident
+                self._async(ident, "wait", "b", wait_id, index=index)
+
+        return traced_done, action_returned
+
+    def end(self, cancelled: bool = False) -> None:
+        """Records the end of the run, and of actions it didn't wait for."""
+        for wait_id, ident in self._waiting.items():
+            self._async(ident, "wait", "e", wait_id, cancelled=True)
+
+        self._waiting.clear()
+        self._async(self.name, "run", "e", self.run_id, cancelled=cancelled)
+
+    def _async(
+        self, name: str, category: str, phase: str, span_id: Any, **args: Any
+    ) -> None:
+        events.append(
+            {
+                "name": name,
+                "cat": category,
+                "ph": phase,
+                "id": span_id,
+                "ts": now(),
+                "pid": _pid,
+                "tid": self.run_id,
+                "args": args,
+            }
+        )
+
+
+def start_run(name: str = "run") -> Optional[RunTrace]:
+    """Starts tracing a run if tracing is enabled."""
+    return RunTrace(name) if enabled else None
+
+
+if trace_env := os.environ.get("ACTIONS_TRACE"):
+    enable(Path(trace_env))
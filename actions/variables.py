@@ -21,6 +21,8 @@ from typing import Any, Optional, Type
 
 from gi.repository import Adw, Gdk, GObject, Gtk
 
+from actions import shared
+
 
 class VariableProperties(GObject.Object):
     """An object that has variable properties."""
@@ -28,26 +30,74 @@ class VariableProperties(GObject.Object):
     __gtype_name__ = "ActionsVariableProperties"
 
     props: dict = {}
+    sources: dict = {}
+    dirty_rows: set = set()
+
+    def __init__(self) -> None:
+        super().__init__()
+
+        self.sources = {}
+        self.dirty_rows = set()
 
-    @GObject.Signal(name="set-from-variable")
-    def get_from_variable(self) -> None:
+    @GObject.Signal(name="sources-changed")
+    def sources_changed(self) -> None:
+        """Emitted when a key of `props` is bound to or unbound from a `VariableReturn`."""
+
+    def set_source(self, key: Any, source: Optional["VariableReturn"]) -> None:
         """
-        Emitted to signal that keys of `props` should be set from a `VariableReturn` if available.
+        Sets `key` of `props` to be set from `source` when executed.
+
+        If `source` is None, the value in `props` is used.
         """
+        if source:
+            self.sources[key] = source
+        else:
+            self.sources.pop(key, None)
+
+        self.emit("sources-changed")
+
+    @GObject.Signal(name="props-changed", arg_types=(str,))
+    def props_changed(self, _key: str) -> None:
+        """Emitted when the value of a key of `props` is changed from a row."""
+
+    def set_prop(self, key: str, value: Any) -> None:
+        """Sets `key` of `props` to `value`."""
+        self.props[key] = value
+        self.emit("props-changed", key)
+
+    @GObject.Signal(name="props-dirty")
+    def props_dirty(self) -> None:
+        """Emitted when a row first has a value that is not in `props` yet."""
+
+    def mark_dirty(self, row: "ActionsVariableRow") -> None:
+        """Marks `row` as having a value that should be pulled into `props`."""
+        if not self.dirty_rows:
+            self.dirty_rows.add(row)
+            self.emit("props-dirty")
+            return
+
+        self.dirty_rows.add(row)
+
+    def pull_props(self) -> None:
+        """Updates `props` from all dirty rows."""
+        for row in self.dirty_rows:
+            row.update_props()
+
+        self.dirty_rows.clear()
 
 
 class VariableReturn:
-    """An object that returns a variable by assigning it to `retval`."""
+    """An object that returns a variable of `type` when executed."""
 
     type: Type = None
-    retval: Any = None
 
 
 class ActionsVariableRow(Gtk.ListBoxRow):
     """
     A row used to represent a property that can be defined by a variable.
 
-    Will set `key` on `props` to the value when it changes.
+    Will set `key` on `props` to the value when it changes,
+    or when `props` are pulled if the `lazy-props` setting is enabled.
     """
 
     __gtype_name__ = "ActionsVariableRow"
@@ -55,24 +105,36 @@ class ActionsVariableRow(Gtk.ListBoxRow):
     _title: Optional[str] = None
     _subtitle: Optional[str] = None
     _icon_name: Optional[str] = None
-    _source: Optional[VariableReturn] = None
 
     row: Adw.PreferencesRow
     props: VariableProperties
     key: Any
 
+    variable_row: Optional[Adw.ActionRow] = None
+    variable_box: Optional[Gtk.Box] = None
+    change_variable_button: Optional[Gtk.Button] = None
+    clear_variable_button: Optional[Gtk.Button] = None
+    clear_variable_revealer: Optional[Gtk.Revealer] = None
+
     type: Type = None
+    lazy: bool = False
+    _binding: bool = False
 
     @property
     def source(self) -> Optional[VariableReturn]:
         """The variable source for this row."""
-        return self._source
+        return self.props.sources.get(self.key)
 
     @source.setter
     def source(self, source: Optional[VariableReturn]) -> None:
-        self._source = source
+        self.props.set_source(self.key, source)
+        self._show_source(source)
 
+    def _show_source(self, source: Optional[VariableReturn]) -> None:
         if source:
+            if not self.variable_row:
+                self._create_variable_row()
+
             self.set_child(self.variable_row)
             self.change_variable_button.set_child(
                 Adw.ButtonContent(icon_name=source.icon_name, label=source.title)
@@ -81,7 +143,9 @@ class ActionsVariableRow(Gtk.ListBoxRow):
 
         else:
             self.set_child(self.row)
-            self.clear_variable_revealer.set_reveal_child(False)
+
+            if self.clear_variable_revealer:
+                self.clear_variable_revealer.set_reveal_child(False)
 
     def get_source(self) -> Optional[VariableReturn]:
         """Gets the variable source for `self`."""
@@ -156,17 +220,8 @@ class ActionsVariableRow(Gtk.ListBoxRow):
         super().__init__(activatable=False, **kwargs)
 
         self.props = props
-
-        self.props.connect(
-            "set-from-variable",
-            lambda *_: (
-                self.props.props.update({self.key: self.source.retval})
-                if self.source
-                else self.update_props()
-            ),
-        )
-
         self.key = key
+        self.lazy = shared.schema.get_boolean("lazy-props")
 
         self.title = title
         self.subtitle = subtitle
@@ -175,6 +230,12 @@ class ActionsVariableRow(Gtk.ListBoxRow):
         self.add_css_class("no-padding")
         self.set_row(row)
 
+        # Rows can be created again for an action, like when scrolled into view
+        if self.source:
+            self._show_source(self.source)
+
+    def _create_variable_row(self) -> None:
+        # Most rows are never bound to a variable, so this is only done when needed
         self.change_variable_button = Gtk.Button(
             valign=Gtk.Align.CENTER, tooltip_text=_("Choose Variable"), has_frame=False
         )
@@ -223,6 +284,29 @@ class ActionsVariableRow(Gtk.ListBoxRow):
     def update_props(self) -> None:
         """Updates `self.props` from the value in the widget."""
 
+    def show_value(self, value: Any) -> None:
+        """Shows `value` in the widget."""
+
+    def bind(self, props: VariableProperties) -> None:
+        """Shows the value and source of `key` in `props`, so the row can be reused."""
+        self.props = props
+
+        self._binding = True
+        self.show_value(props.props[self.key])
+        self._binding = False
+
+        self._show_source(self.source)
+
+    def value_changed(self) -> None:
+        """Called when the value in the widget changes."""
+        if self._binding:
+            return
+
+        if self.lazy:
+            self.props.mark_dirty(self)
+        else:
+            self.update_props()
+
     def do_focus(self, direction: Gtk.DirectionType) -> bool:
         if not self.row:
             return False
@@ -306,10 +390,13 @@ class ActionsVariableSpinRow(ActionsVariableRow):
             Adw.SpinRow(adjustment=adjustment, digits=digits), float, **kwargs
         )
 
-        self.row.connect("notify::value", lambda *_: self.update_props())
+        self.row.connect("notify::value", lambda *_: self.value_changed())
 
     def update_props(self) -> None:
-        self.props.props.update({self.key: self.row.get_value()})
+        self.props.set_prop(self.key, self.row.get_value())
+
+    def show_value(self, value: Any) -> None:
+        self.row.set_value(value)
 
 
 class ActionsVariableEntryRow(ActionsVariableRow):
@@ -326,7 +413,10 @@ class ActionsVariableEntryRow(ActionsVariableRow):
     def __init__(self, text: Optional[str], **kwargs: Any) -> None:
         super().__init__(Adw.EntryRow(text=text or ""), str, **kwargs)
 
-        self.row.connect("changed", lambda *_: self.update_props())
+        self.row.connect("changed", lambda *_: self.value_changed())
 
     def update_props(self) -> None:
-        self.props.props.update({self.key: self.row.get_text()})
+        self.props.set_prop(self.key, self.row.get_text())
+
+    def show_value(self, value: Any) -> None:
+        self.row.set_text(value or "")
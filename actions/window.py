@@ -20,17 +20,26 @@
 """The main application window."""
 
 import logging
-from collections import namedtuple
+from pathlib import Path
 from textwrap import dedent
-from typing import Any, Optional
-
-from gi.repository import Adw, Gio, Gtk, Pango
-
-from actions import shared
-from actions.actions import Action, groups
-from actions.variables import ActionsVariableRow
-
-Action = namedtuple("Action", "title props")
+from typing import Any, Optional, Sequence, Type
+
+from gi.repository import Adw, Gio, GLib, Gtk, Pango
+
+from actions import memory, shared
+from actions.actions import Action
+from actions.autosave import Autosave
+from actions.engine import (
+    Executor,
+    Plan,
+    RunContext,
+    Workflow,
+    compile_plan,
+    get_bindings,
+)
+from actions.registry import ActionInfo, registry
+from actions.storage import get_specs, load_file, save_file
+from actions.variables import ActionsVariableRow, VariableProperties
 
 
 @Gtk.Template(resource_path=f"{shared.PREFIX}/gtk/window.ui")
@@ -52,23 +61,74 @@ class ActionsWindow(Adw.ApplicationWindow):
     cancel_revealer: Optional[Gtk.Revealer] = None
     cancel_button: Optional[Gtk.Button] = None
 
+    actions_view: Optional[Gtk.ListView] = None
+    workflow_page: Optional[Adw.NavigationPage] = None
+
+    path: Optional[Path] = None
+    plan: Optional[Plan] = None
+    last_run: Optional[RunContext] = None
+
+    # The props, key, type and index of the action of the row a variable is chosen for
+    choosing: Optional[tuple[VariableProperties, Any, Type, int]] = None
+
     def __init__(self, **kwargs: Any) -> None:
         super().__init__(**kwargs)
 
-        self.actions_box = None
-        self.actions = {}
+        self.actions = Gio.ListStore(item_type=Action)
+        self.dirty_actions = set()
+        self.path = None
+        self.plan = None
+        self.last_run = None
+        self.runs = set()
+        self.catalog_populated = False
+
+        # Widgets of actions that are not shown, by the class of the action
+        self.widget_pool = {}
+
+        # The index of each action, so edits can be autosaved without searching
+        self.indices = {}
+        self.autosave = Autosave(
+            Path(GLib.get_user_data_dir()) / "actions" / "autosave",
+            # Values typed into rows with `lazy-props` are only recorded once pulled
+            before_flush=self.pull_props,
+        )
+        self.connect("close-request", self.on_close_request)
 
         if shared.PROFILE == "development":
             self.add_css_class("devel")
 
         self.status_page.set_icon_name(shared.APP_ID)
 
-        for title, actions in groups.items():
+        self.recover_workflow()
+
+    def recover_workflow(self) -> None:
+        """Shows the autosaved workflow if the app didn't quit cleanly."""
+        if not (specs := self.autosave.recover()):
+            return
+
+        try:
+            workflow = Workflow(specs, self.get_application())
+        except ValueError as error:
+            logging.error("Cannot recover workflow: %s", error)
+            self.autosave.discard()
+            return
+
+        self.show_workflow(workflow)
+
+    def populate_catalog(self) -> None:
+        """Adds rows for all actions to the actions dialog if they weren't added yet."""
+        if self.catalog_populated:
+            return
+
+        self.catalog_populated = True
+
+        # Rendered from metadata, so plugins are only imported once an action is added
+        for title, infos in registry.get_groups().items():
             group = Adw.PreferencesGroup(title=title, separate_rows=True)
 
-            for index, action in enumerate(actions):
-                group.add(row := Adw.ActionRow(title=action.title, activatable=True))
-                row.add_prefix(Gtk.Image(icon_name=action.icon_name))
+            for info in infos:
+                group.add(row := Adw.ActionRow(title=info.title, activatable=True))
+                row.add_prefix(Gtk.Image(icon_name=info.icon_name))
                 row.add_suffix(
                     info_button := Gtk.Button(
                         has_frame=False,
@@ -78,64 +138,257 @@ class ActionsWindow(Adw.ApplicationWindow):
                     )
                 )
 
-                toolbar_view = Adw.ToolbarView()
-                toolbar_view.add_top_bar(Adw.HeaderBar())
-                # TODO: Translations
-                toolbar_view.set_content(
-                    Gtk.ScrolledWindow(
-                        child=Gtk.Label(
-                            margin_start=24,
-                            margin_end=24,
-                            halign=Gtk.Align.START,
-                            valign=Gtk.Align.START,
-                            xalign=0.0,
-                            label=dedent(action.doc),
-                            wrap=True,
-                            use_markup=True,
-                            attributes=Pango.AttrList.from_string("0 -1 size 13000"),
-                        )
-                    )
+                row.connect(
+                    "activated",
+                    lambda _obj, i=info: self.add_action(
+                        registry.get_action_class(i.ident)
+                    ),
                 )
-
-                row.connect("activated", lambda _obj, a=action: self.add_action(a))
                 info_button.connect(
-                    "clicked",
-                    lambda _obj, view=toolbar_view, title=action.title: self.actions_dialog.push_subpage(
-                        Adw.NavigationPage.new(view, title)
-                    ),
+                    "clicked", lambda _obj, i=info: self.present_action_info(i)
                 )
 
             self.actions_page.add(group)
 
-    def add_action(self, action: Action) -> None:
+    def present_actions_dialog(self) -> None:
+        """Presents the dialog to add an action, populating it the first time."""
+        # Not done on startup, so opening a window doesn't depend on the number of actions
+        self.populate_catalog()
+        self.actions_dialog.present(self)
+
+    def present_action_info(self, info: ActionInfo) -> None:
+        """Shows a page with more information about an action in the actions dialog."""
+        toolbar_view = Adw.ToolbarView()
+        toolbar_view.add_top_bar(Adw.HeaderBar())
+        # TODO: Translations
+        toolbar_view.set_content(
+            Gtk.ScrolledWindow(
+                child=Gtk.Label(
+                    margin_start=24,
+                    margin_end=24,
+                    halign=Gtk.Align.START,
+                    valign=Gtk.Align.START,
+                    xalign=0.0,
+                    label=dedent(info.doc),
+                    wrap=True,
+                    use_markup=True,
+                    attributes=Pango.AttrList.from_string("0 -1 size 13000"),
+                )
+            )
+        )
+
+        self.actions_dialog.push_subpage(
+            Adw.NavigationPage.new(toolbar_view, info.title)
+        )
+
+    def add_action(self, action: Type[Action]) -> None:
         """Appends `action` to the workflow."""
         self.actions_dialog.force_close()
 
-        if not self.actions_box:
+        if not self.actions_view:
+            return
+
+        with memory.track("add_action", action.ident):
+            self.append_actions((action(self.get_application()),))
+
+        self.actions_view.scroll_to(
+            self.actions.get_n_items() - 1, Gtk.ListScrollFlags.NONE, None
+        )
+
+    def append_actions(self, actions: Sequence[Action], record: bool = True) -> None:
+        """
+        Appends `actions` to the workflow.
+
+        If `record` is False, the actions are not autosaved.
+        """
+        for action in actions:
+            self.indices[action] = len(self.indices)
+
+            action.connect("sources-changed", self.on_sources_changed)
+            action.connect("props-changed", self.on_props_changed)
+            action.connect("props-dirty", self.on_props_dirty)
+
+            if record:
+                self.autosave.add(action.ident, dict(action.props))
+
+        self.actions.splice(self.actions.get_n_items(), 0, actions)
+        self.invalidate_plan()
+
+    def show_workflow(self, workflow: Workflow) -> None:
+        """Replaces the current workflow with `workflow`."""
+        if not self.actions_view:
+            self.create_workflow()
+        else:
+            self.actions.remove_all()
+            self.indices.clear()
+            self.dirty_actions.clear()
+            self.last_run = None
+
+            # It might have been popped with the back button
+            if self.navigation_view.get_visible_page() is not self.workflow_page:
+                self.navigation_view.push(self.workflow_page)
+
+        self.append_actions(workflow.actions, record=False)
+        self.plan = workflow.plan
+        self.autosave.reset(get_specs(workflow.actions))
+
+    def on_sources_changed(self, action: Action) -> None:
+        self.invalidate_plan()
+        self.autosave.set_sources(
+            self.indices[action],
+            {key: self.indices[source] for key, source in action.sources.items()},
+        )
+
+    def on_props_changed(self, action: Action, key: str) -> None:
+        self.autosave.set_prop(self.indices[action], key, action.props[key])
+
+    def on_props_dirty(self, action: Action) -> None:
+        self.dirty_actions.add(action)
+        self.autosave.schedule_flush()
+
+    def on_close_request(self, *_args: Any) -> bool:
+        # The window was closed on purpose, so there is nothing to recover
+        self.autosave.discard()
+        self.cancel_runs()
+        return False
+
+    def open(self) -> None:
+        """Asks for a workflow file to open."""
+        Gtk.FileDialog(default_filter=self.get_file_filter()).open(
+            self, None, self.on_open_finish
+        )
+
+    def on_open_finish(self, dialog: Gtk.FileDialog, result: Gio.AsyncResult) -> None:
+        try:
+            gfile = dialog.open_finish(result)
+        except GLib.Error:
+            return
+
+        self.load_workflow(Path(gfile.get_path()))
+
+    def load_workflow(self, path: Path) -> None:
+        """
+        Opens the workflow at `path`.
+
+        Widgets are only created for actions once they are scrolled into view.
+        """
+        try:
+            workflow = Workflow(load_file(path), self.get_application())
+        except (OSError, ValueError) as error:
+            logging.error("Cannot open %s: %s", path, error)
+            self.present_error(_("Cannot Open Workflow"), str(error))
+            return
+
+        self.show_workflow(workflow)
+        self.path = path
+
+    def save(self) -> None:
+        """Saves the workflow, asking for a file if it wasn't saved before."""
+        if not self.actions_view:
             return
 
-        instance = action(self.get_application())
-        widget = instance.get_widget()
+        if self.path:
+            self.save_workflow(self.path)
+            return
 
-        self.actions[widget] = instance
-        self.actions_box.append(widget)
+        Gtk.FileDialog(
+            default_filter=self.get_file_filter(),
+            initial_name=_("Workflow") + ".workflow",
+        ).save(self, None, self.on_save_finish)
+
+    def on_save_finish(self, dialog: Gtk.FileDialog, result: Gio.AsyncResult) -> None:
+        try:
+            gfile = dialog.save_finish(result)
+        except GLib.Error:
+            return
+
+        self.save_workflow(Path(gfile.get_path()))
+
+    def save_workflow(self, path: Path) -> None:
+        """Saves the workflow to `path`."""
+        self.pull_props()
+
+        try:
+            save_file(path, get_specs(tuple(self.actions)))
+        except OSError as error:
+            logging.error("Cannot save %s: %s", path, error)
+            self.present_error(_("Cannot Save Workflow"), str(error))
+            return
+
+        self.path = path
+
+    def get_file_filter(self) -> Gtk.FileFilter:
+        """Gets a filter for workflow files."""
+        (file_filter := Gtk.FileFilter(name=_("Workflows"))).add_pattern("*.workflow")
+        return file_filter
+
+    def present_error(self, heading: str, body: str) -> None:
+        """Presents a dialog with an error message."""
+        (dialog := Adw.AlertDialog(heading=heading, body=body)).add_response(
+            "close", _("Close")
+        )
+        dialog.present(self)
+
+    def invalidate_plan(self) -> None:
+        """Discards the compiled plan after the workflow was edited."""
+        self.plan = None
+
+    def get_plan(self) -> Plan:
+        """Gets the compiled plan for the workflow, compiling it if it was edited."""
+        if self.plan is None:
+            actions = tuple(self.actions)
+            self.plan = compile_plan(actions, get_bindings(actions))
+
+        return self.plan
+
+    def pull_props(self) -> None:
+        """Updates the props of actions from rows that changed since the last pull."""
+        for action in self.dirty_actions:
+            action.pull_props()
+
+        self.dirty_actions.clear()
 
     def run(self) -> None:
         """Executes the workflow."""
 
-        if not (length := len(self.actions)):
+        if not self.actions.get_n_items():
             return
 
-        last = length - 1
+        self.pull_props()
+
+        if shared.schema.get_boolean("incremental-runs"):
+            # Only actions whose props or sources changed since the last run are executed
+            executor = Executor(self.get_plan(), previous=self.last_run, record=True)
+            self.last_run = executor.context
+        else:
+            executor = Executor(self.get_plan())
+
+        executor.cb = lambda: self.on_run_finished(executor)
+        self.runs.add(executor)
+        self.update_cancel_button()
+
+        executor.start()
 
-        values = list(self.actions.values())
+    def on_run_finished(self, executor: Executor) -> None:
+        self.runs.discard(executor)
+        self.update_cancel_button()
 
-        for index, action in reversed(list(enumerate(values))):
-            if index != last:
-                action.cb = values[index + 1].get_callable()
+    def cancel_runs(self) -> None:
+        """Cancels all runs that haven't finished yet."""
+        for executor in tuple(self.runs):
+            executor.cancel()
 
-            if index == 0:
-                action.get_callable()()
+    def on_cancel_clicked(self, *_args: Any) -> None:
+        if self.choosing:
+            self.stop_choosing_variable()
+            return
+
+        self.cancel_runs()
+
+    def update_cancel_button(self) -> None:
+        """Shows the cancel button while choosing a variable or while a run is going."""
+        self.cancel_revealer.set_transition_type(Gtk.RevealerTransitionType.CROSSFADE)
+        self.cancel_revealer.set_reveal_child(bool(self.runs or self.choosing))
 
     def choose_variable(self, row: ActionsVariableRow) -> None:
         self.header_bar.set_show_back_button(False)
@@ -144,66 +397,117 @@ class ActionsWindow(Adw.ApplicationWindow):
         self.run_button.set_sensitive(False)
         self.add_group.set_sensitive(False)
 
-        reached = False
-        for widget, action in self.actions.items():
-            widget.set_can_target(False)
-            reached = reached or action == row.props
-
-            if reached or (action.type != row.type):
-                widget.set_sensitive(False)
-                continue
+        found, index = self.actions.find(row.props)
+        self.choosing = (row.props, row.key, row.type, index if found else 0)
+        self.refresh_actions()
 
-        self.actions_box.set_selection_mode(Gtk.SelectionMode.BROWSE)
-        self.actions_box.connect("row-selected", self.on_row_selected, row)
-
-    def on_row_selected(
-        self,
-        _obj: Any = None,
-        selected_row: Optional[Gtk.ListBoxRow] = None,
-        variable_row: Optional[ActionsVariableRow] = None,
-    ) -> None:
+    def stop_choosing_variable(self, source: Optional[Action] = None) -> None:
+        """Stops choosing a variable, setting `source` as the variable if it is not None."""
         self.header_bar.set_show_back_button(True)
         self.cancel_revealer.set_transition_type(Gtk.RevealerTransitionType.NONE)
-        self.cancel_revealer.set_reveal_child(False)
+        self.cancel_revealer.set_reveal_child(bool(self.runs))
         self.run_button.set_sensitive(True)
         self.add_group.set_sensitive(True)
 
-        self.actions_box.set_selection_mode(Gtk.SelectionMode.NONE)
-        self.actions_box.disconnect_by_func(self.on_row_selected)
+        if source and self.choosing:
+            props, key, _type, _index = self.choosing
+            props.set_source(key, source)
+
+        self.choosing = None
+
+        self.refresh_actions()
+
+    def can_choose(self, position: int, action: Action) -> bool:
+        """Whether `action` at `position` can be chosen as a variable right now."""
+        if not self.choosing:
+            return False
+
+        _props, _key, type_, index = self.choosing
+        return position < index and action.type == type_
+
+    def refresh_actions(self) -> None:
+        """Creates the widgets for all visible actions again."""
+        n_items = self.actions.get_n_items()
+        self.actions.items_changed(0, n_items, n_items)
 
-        for widget in self.actions:
+    def on_action_activated(self, _obj: Any, position: int) -> None:
+        if self.can_choose(position, action := self.actions.get_item(position)):
+            self.stop_choosing_variable(action)
+
+    def on_bind_action(self, _obj: Any, list_item: Gtk.ListItem) -> None:
+        action = list_item.get_item()
+
+        # Rows of actions scrolled out of view are reused for ones of the same class
+        if pool := self.widget_pool.get(type(action)):
+            action.bind_widget(widget := pool.pop())
+        else:
+            with memory.track("widget", action.ident):
+                widget = action.get_widget()
+
+            widget.add_css_class("card")
+
+        if self.choosing:
+            chooseable = self.can_choose(list_item.get_position(), action)
+
+            # Clicks go to the list item so it can be activated
+            widget.set_can_target(False)
+            widget.set_sensitive(chooseable)
+            list_item.set_activatable(chooseable)
+        else:
             widget.set_can_target(True)
             widget.set_sensitive(True)
+            list_item.set_activatable(False)
 
-        if not selected_row:
+        list_item.set_child(widget)
+
+    def on_unbind_action(self, _obj: Any, list_item: Gtk.ListItem) -> None:
+        widget = list_item.get_child()
+        list_item.set_child(None)
+
+        if not (action := list_item.get_item()):
             return
 
-        variable_row.source = self.actions[selected_row]
+        # Keep values typed into the row before it shows another action
+        action.pull_props()
+
+        if widget:
+            self.widget_pool.setdefault(type(action), []).append(widget)
 
     @Gtk.Template.Callback()
     def create_workflow(self, *_args: Any) -> None:
-        self.actions_box = Gtk.ListBox(selection_mode=Gtk.SelectionMode.NONE)
-        self.actions_box.add_css_class("boxed-list-separate")
+        factory = Gtk.SignalListItemFactory()
+        factory.connect("bind", self.on_bind_action)
+        factory.connect("unbind", self.on_unbind_action)
+
+        # Only rows in view have widgets, so long workflows stay cheap
+        self.actions_view = Gtk.ListView(
+            model=Gtk.NoSelection(model=self.actions),
+            factory=factory,
+            single_click_activate=True,
+        )
+        self.actions_view.add_css_class("actions-list")
+        self.actions_view.connect("activate", self.on_action_activated)
 
-        (group := Adw.PreferencesGroup()).add(self.actions_box)
-        (page := Adw.PreferencesPage()).add(group)
+        page = Gtk.ScrolledWindow(
+            hscrollbar_policy=Gtk.PolicyType.NEVER,
+            vexpand=True,
+            child=Adw.ClampScrollable(child=self.actions_view),
+        )
 
         self.add_group = Adw.PreferencesGroup()
 
-        page.add(self.add_group)
-
         self.add_group.add(
             add_button := Adw.ButtonRow(
                 title=_("Add Action"), start_icon_name="list-add-symbolic"
             )
         )
 
-        add_button.connect("activated", lambda *_: self.actions_dialog.present(self))
+        add_button.connect("activated", lambda *_: self.present_actions_dialog())
 
         self.header_bar = Adw.HeaderBar()
 
         self.cancel_button = Gtk.Button(label=_("Cancel"))
-        self.cancel_button.connect("clicked", lambda *_: self.on_row_selected())
+        self.cancel_button.connect("clicked", self.on_cancel_clicked)
 
         self.cancel_revealer = Gtk.Revealer(child=self.cancel_button)
 
@@ -218,11 +522,26 @@ class ActionsWindow(Adw.ApplicationWindow):
         self.run_button.connect("clicked", lambda *_: self.run())
 
         self.header_bar.pack_end(self.run_button)
+        self.header_bar.pack_end(
+            Gtk.Button(
+                icon_name="document-save-symbolic",
+                tooltip_text=_("Save"),
+                action_name="app.save",
+            )
+        )
 
         toolbar_view = Adw.ToolbarView()
         toolbar_view.add_top_bar(self.header_bar)
         toolbar_view.set_content(page)
-
-        self.navigation_view.push(
-            Adw.NavigationPage.new(toolbar_view, _("New Workflow"))
+        toolbar_view.add_bottom_bar(
+            Adw.Clamp(
+                child=self.add_group,
+                margin_top=12,
+                margin_bottom=12,
+                margin_start=12,
+                margin_end=12,
+            )
         )
+
+        self.workflow_page = Adw.NavigationPage.new(toolbar_view, _("New Workflow"))
+        self.navigation_view.push(self.workflow_page)
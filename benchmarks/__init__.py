@@ -0,0 +1,47 @@
+# __init__.py
+#
+# Copyright 2024 kramo
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+"""
+Benchmarks for hot paths, run from the source root.
+
+Run all of them with `python3 -m benchmarks`, or one with `python3 -m benchmarks.<name>`.
+"""
+
+import gettext
+import time
+from typing import Callable
+
+import gi
+
+gi.require_version("Gtk", "4.0")
+gi.require_version("Adw", "1")
+
+gettext.install("actions")
+
+
+def measure(func: Callable[[], None], repeat: int = 5) -> float:
+    """Calls `func` `repeat` times and returns the best time in seconds."""
+    best = float("inf")
+
+    for _index in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+
+    return best
@@ -0,0 +1,279 @@
+# __main__.py
+#
+# Copyright 2024 kramo
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+"""
+Runs all benchmarks and writes the results as JSON, to compare them across commits.
+
+The app has to be built and installed first, pass its data directory
+(like `/usr/local/share/actions`) with `--pkgdatadir`.
+
+Benchmarks that draw need a display, but it doesn't have to be a real one.
+Without one, `Xvfb` or else `broadwayd` is started for the run.
+Rendering uses Cairo unless `GSK_RENDERER` is set, so the GPU doesn't add noise.
+"""
+
+import argparse
+import importlib
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Optional
+
+# The module of each benchmark and whether it needs a display
+BENCHMARKS = {
+    "throughput": ("benchmarks.throughput", False),
+    "step-overhead": ("benchmarks.step_overhead", False),
+    "row-cost": ("benchmarks.row_cost", True),
+    "add-action": ("benchmarks.add_action", True),
+    "catalog": ("benchmarks.catalog", True),
+    "first-frame": ("benchmarks.first_frame", True),
+}
+
+
+def _setup(pkgdatadir: Optional[Path]) -> None:
+    # Before GTK is imported, so it picks these up
+    os.environ.setdefault("GSK_RENDERER", "cairo")
+
+    # Keep autosaves, plugins and caches of the benchmarks away from the user's
+    home = Path(tempfile.mkdtemp(prefix="actions-benchmarks-"))
+    for name in ("XDG_DATA_HOME", "XDG_CACHE_HOME", "XDG_CONFIG_HOME"):
+        os.environ[name] = str(home / name.lower())
+
+    if not pkgdatadir:
+        return
+
+    sys.path.insert(0, str(pkgdatadir))
+
+    if (schemas := pkgdatadir.parent / "glib-2.0" / "schemas").is_dir():
+        os.environ["GSETTINGS_SCHEMA_DIR"] = str(schemas)
+
+    # pylint: disable-next=import-outside-toplevel
+    from gi.repository import Gio
+
+    Gio.Resource.load(str(pkgdatadir / "actions.gresource"))._register()
+
+
+def _start_xvfb() -> Optional[subprocess.Popen]:
+    read_fd, write_fd = os.pipe()
+
+    try:
+        server = subprocess.Popen(  # pylint: disable=consider-using-with
+            ("Xvfb", "-displayfd", str(write_fd), "-nolisten", "tcp"),
+            pass_fds=(write_fd,),
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+    except OSError:
+        os.close(read_fd)
+        return None
+    finally:
+        os.close(write_fd)
+
+    # Xvfb writes the number of the display it picked once it accepts clients
+    with os.fdopen(read_fd) as pipe:
+        number = pipe.readline().strip()
+
+    if not number:
+        server.wait()
+        return None
+
+    os.environ["GDK_BACKEND"] = "x11"
+    os.environ["DISPLAY"] = f":{number}"
+    return server
+
+
+def _start_broadwayd() -> Optional[subprocess.Popen]:
+    # pylint: disable-next=import-outside-toplevel
+    from gi.repository import GLib
+
+    # Display :N is served on `broadway<N + 1>.socket` in the runtime directory
+    runtime_dir = Path(GLib.get_user_runtime_dir())
+    number = next(
+        number
+        for number in range(1, 100)
+        if not (runtime_dir / f"broadway{number + 1}.socket").exists()
+    )
+    socket = runtime_dir / f"broadway{number + 1}.socket"
+
+    try:
+        server = subprocess.Popen(  # pylint: disable=consider-using-with
+            ("broadwayd", f":{number}"),
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+    except OSError:
+        return None
+
+    deadline = time.monotonic() + 5
+
+    while not socket.exists():
+        if server.poll() is not None or time.monotonic() > deadline:
+            server.kill()
+            server.wait()
+            return None
+
+        time.sleep(0.05)
+
+    os.environ["GDK_BACKEND"] = "broadway"
+    os.environ["BROADWAY_DISPLAY"] = f":{number}"
+    return server
+
+
+def _start_display() -> Optional[subprocess.Popen]:
+    """Starts a headless display server unless there already is a display."""
+    if any(
+        name in os.environ
+        for name in ("DISPLAY", "WAYLAND_DISPLAY", "BROADWAY_DISPLAY")
+    ):
+        return None
+
+    return _start_xvfb() or _start_broadwayd()
+
+
+def _get_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ("git", "rev-parse", "HEAD"),
+            capture_output=True,
+            check=True,
+            text=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _run(
+    parser: argparse.ArgumentParser,
+    args: argparse.Namespace,
+    names: tuple[str, ...],
+    needs_display: bool,
+) -> int:
+    try:
+        importlib.import_module("actions.shared")
+    except ImportError:
+        parser.error("the app is not built, pass the data directory of an installation")
+
+    # pylint: disable=import-outside-toplevel
+    from gi.repository import Gdk, Gtk
+
+    display = Gdk.Display.get_default()
+
+    if needs_display and not display:
+        parser.error("cannot open a display, install Xvfb or broadwayd")
+
+    results: dict[str, Any] = {}
+
+    for name in names:
+        print(f"Running {name}…", file=sys.stderr)
+        module_name = BENCHMARKS[name][0]
+        module = importlib.import_module(module_name)
+
+        try:
+            results[name] = (
+                module.run(args.launcher) if name == "first-frame" else module.run()
+            )
+        except Exception as error:  # pylint: disable=broad-exception-caught
+            results[name] = {"error": str(error)}
+
+    args.output.write_text(
+        json.dumps(
+            {
+                "commit": _get_commit(),
+                "date": datetime.now(timezone.utc).isoformat(),
+                "python": platform.python_version(),
+                "gtk": ".".join(
+                    str(version)
+                    for version in (
+                        Gtk.get_major_version(),
+                        Gtk.get_minor_version(),
+                        Gtk.get_micro_version(),
+                    )
+                ),
+                "display": display.get_name() if display else None,
+                "renderer": os.environ.get("GSK_RENDERER"),
+                "results": results,
+            },
+            indent=2,
+        )
+        + "\n",
+        encoding="utf-8",
+    )
+
+    print(f"Results written to {args.output}", file=sys.stderr)
+    return 0
+
+
+def main() -> int:
+    """Runs the benchmarks picked on the command line."""
+    parser = argparse.ArgumentParser(
+        prog="python3 -m benchmarks", description="Run the benchmarks of Actions"
+    )
+    parser.add_argument(
+        "names",
+        nargs="*",
+        metavar="NAME",
+        help=f"Benchmarks to run, all by default ({', '.join(BENCHMARKS)})",
+    )
+    parser.add_argument(
+        "-o",
+        "--output",
+        type=Path,
+        default=Path("benchmarks.json"),
+        help="File to write the results to",
+    )
+    parser.add_argument(
+        "--pkgdatadir",
+        type=Path,
+        default=os.environ.get("ACTIONS_PKGDATADIR"),
+        help="Data directory of the installed app",
+    )
+    parser.add_argument(
+        "--launcher",
+        default=os.environ.get("ACTIONS_LAUNCHER", "actions"),
+        help="Installed executable to measure startup with",
+    )
+    args = parser.parse_args()
+
+    if unknown := set(args.names) - set(BENCHMARKS):
+        parser.error(f"unknown benchmarks: {', '.join(sorted(unknown))}")
+
+    names = tuple(args.names) or tuple(BENCHMARKS)
+    needs_display = any(BENCHMARKS[name][1] for name in names)
+
+    _setup(args.pkgdatadir)
+
+    # Before GTK is imported, so it connects to the new display
+    server = _start_display() if needs_display else None
+
+    try:
+        return _run(parser, args, names, needs_display)
+    finally:
+        if server:
+            server.terminate()
+            server.wait()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
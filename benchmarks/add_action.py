@@ -0,0 +1,66 @@
+# add_action.py
+#
+# Copyright 2024 kramo
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+"""
+Time to add actions to the editor of a window, including building their rows.
+
+Needs a display and the built resources, see `benchmarks.__main__`.
+"""
+
+from gi.repository import GLib
+
+from benchmarks import measure
+
+ACTIONS = 100
+
+
+def _iterate() -> None:
+    context = GLib.MainContext.default()
+
+    while context.pending():
+        context.iteration(False)
+
+
+def run(actions: int = ACTIONS) -> dict:
+    """Runs the benchmark and returns the time per added action in seconds."""
+    # pylint: disable=import-outside-toplevel
+    from actions.actions import NotificationAction
+    from actions.window import ActionsWindow
+
+    window = ActionsWindow()
+    window.create_workflow()
+    window.present()
+    _iterate()
+
+    def add() -> None:
+        for _index in range(actions):
+            window.add_action(NotificationAction)
+
+        # Rows are only built once the list is laid out
+        _iterate()
+
+    seconds = measure(add, repeat=1) / actions
+    window.destroy()
+
+    return {"notification": seconds}
+
+
+if __name__ == "__main__":
+    for name, seconds in run().items():
+        print(f"{name}: {seconds * 1000:.3f} ms/action")
@@ -0,0 +1,69 @@
+# catalog.py
+#
+# Copyright 2024 kramo
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+"""
+Time to create a window and to build its catalog of actions.
+
+The catalog is only built when the actions dialog is first shown,
+so both are measured on their own. Needs a display and the built resources,
+see `benchmarks.__main__`.
+"""
+
+import time
+
+from benchmarks import measure
+
+REPEAT = 5
+
+
+def run(repeat: int = REPEAT) -> dict:
+    """Runs the benchmark and returns the best times in seconds."""
+    # pylint: disable=import-outside-toplevel
+    from actions.registry import registry
+    from actions.window import ActionsWindow
+
+    windows = []
+    populate = float("inf")
+
+    def create() -> None:
+        windows.append(ActionsWindow())
+
+    init = measure(create, repeat)
+
+    for window in windows:
+        start = time.perf_counter()
+        window.populate_catalog()
+        populate = min(populate, time.perf_counter() - start)
+        window.destroy()
+
+    # With the metadata index cached, like on every start but the first
+    def discover() -> None:
+        registry.refresh()
+        registry.get_groups()
+
+    return {
+        "window-init": init,
+        "populate-catalog": populate,
+        "discover-plugins": measure(discover, repeat),
+    }
+
+
+if __name__ == "__main__":
+    for name, seconds in run().items():
+        print(f"{name}: {seconds * 1000:.3f} ms")
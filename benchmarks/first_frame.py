@@ -0,0 +1,86 @@
+# first_frame.py
+#
+# Copyright 2024 kramo
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+"""
+Time from starting the process until the first frame of the window is drawn.
+
+Starts the installed launcher with `--profile-startup` and reads its report.
+"""
+
+import os
+import re
+import subprocess
+import threading
+from typing import Optional
+
+LAUNCHER = "actions"
+REPEAT = 3
+TIMEOUT = 30
+
+_mark = re.compile(r"^startup: (?P<name>[\w-]+): (?P<ms>[\d.]+) ms$")
+
+
+def _start(launcher: str) -> Optional[dict]:
+    with subprocess.Popen(
+        (launcher, "--profile-startup"),
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        text=True,
+    ) as process:
+        marks = {}
+
+        # Killing the process closes stderr, which stops reading it
+        (timer := threading.Timer(TIMEOUT, process.kill)).start()
+
+        try:
+            for line in process.stderr:
+                if match := _mark.match(line.strip()):
+                    marks[match["name"]] = float(match["ms"]) / 1000
+
+                if "first-frame" in marks:
+                    break
+        finally:
+            timer.cancel()
+            process.terminate()
+
+    return marks if "first-frame" in marks else None
+
+
+def run(launcher: str = LAUNCHER, repeat: int = REPEAT) -> dict:
+    """
+    Runs the benchmark and returns the best time in seconds for each startup mark.
+
+    Every run is a new instance, so no other instance of the app should be running.
+    """
+    best = {}
+
+    for _index in range(repeat):
+        if not (marks := _start(launcher)):
+            raise RuntimeError(f"{launcher} did not draw a frame")
+
+        for name, seconds in marks.items():
+            best[name] = min(best.get(name, float("inf")), seconds)
+
+    return best
+
+
+if __name__ == "__main__":
+    for name, seconds in run(os.environ.get("ACTIONS_LAUNCHER", LAUNCHER)).items():
+        print(f"{name}: {seconds * 1000:.1f} ms")
@@ -0,0 +1,64 @@
+# row_cost.py
+#
+# Copyright 2024 kramo
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+"""Widgets and memory allocated per action when adding `NotificationAction`s."""
+
+import tracemalloc
+
+from gi.repository import Adw, Gtk
+
+from actions.actions import NotificationAction
+
+ACTIONS = 500
+
+
+def count_widgets(widget: Gtk.Widget) -> int:
+    """Counts `widget` and all of its descendants."""
+    count = 1
+    child = widget.get_first_child()
+
+    while child:
+        count += count_widgets(child)
+        child = child.get_next_sibling()
+
+    return count
+
+
+def run(actions: int = ACTIONS) -> dict:
+    """Runs the benchmark and returns the widgets and bytes allocated per action."""
+    Adw.init()
+
+    tracemalloc.start()
+    start, _peak = tracemalloc.get_traced_memory()
+
+    widgets = [NotificationAction().get_widget() for _index in range(actions)]
+
+    allocated, _peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "widgets": sum(count_widgets(widget) for widget in widgets) / actions,
+        "bytes": (allocated - start) / actions,
+    }
+
+
+if __name__ == "__main__":
+    results = run()
+    print(f"widgets: {results['widgets']:.1f}/action")
+    print(f"python memory: {results['bytes'] / 1024:.1f} KiB/action")
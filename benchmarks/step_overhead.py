@@ -0,0 +1,102 @@
+# step_overhead.py
+#
+# Copyright 2024 kramo
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+"""
+Per-step overhead of resolving variables with a binding table
+compared to emitting `set-from-variable` before each step.
+
+The signal path is reconstructed here, as actions no longer have the signal.
+"""
+
+from typing import Any, Callable
+
+from gi.repository import GObject
+
+from actions.actions import FloatVariableAction, Invocation
+from actions.engine import Binding, Executor, Plan, compile_plan
+from benchmarks import measure
+
+STEPS = 10000
+
+
+class _Emitter(GObject.Object):
+    __gtype_name__ = "ActionsBenchmarkEmitter"
+
+    @GObject.Signal(name="set-from-variable")
+    def set_from_variable(self) -> None:
+        """Emitted before each step."""
+
+
+def _signal_steps(plan: Plan) -> tuple[Callable, ...]:
+    retvals = {}
+    steps = []
+
+    for index, action in enumerate(plan.actions):
+        emitter = _Emitter()
+        func = action._get_action_func()  # pylint: disable=protected-access
+
+        if index:
+            source = plan.actions[index - 1]
+            emitter.connect(
+                "set-from-variable",
+                lambda _obj, action=action, source=source: action.props.update(
+                    {"float": retvals.get(source)}
+                ),
+            )
+
+        def step(
+            _context: Any,
+            done: Callable,
+            end: Callable,
+            action: FloatVariableAction = action,
+            emitter: _Emitter = emitter,
+            func: Callable = func,
+        ) -> None:
+            def set_retval(retval: Any = None) -> None:
+                retvals[action] = retval
+                done(retval)
+
+            emitter.emit("set-from-variable")
+            func(Invocation(action.props, set_retval, end))
+
+        steps.append(step)
+
+    return tuple(steps)
+
+
+def run(steps: int = STEPS) -> dict:
+    """Runs the benchmark and returns the time per step in seconds for each approach."""
+    actions = [FloatVariableAction() for _index in range(steps)]
+    # Memoizing would skip the pure actions' steps after the first run
+    plan = compile_plan(
+        actions,
+        (Binding(index, "float", index - 1) for index in range(1, steps)),
+        cache=None,
+    )
+    signal_plan = plan._replace(steps=_signal_steps(plan))
+
+    return {
+        "signal": measure(lambda: Executor(signal_plan).start()) / steps,
+        "binding-table": measure(lambda: Executor(plan).start()) / steps,
+    }
+
+
+if __name__ == "__main__":
+    for name, seconds in run().items():
+        print(f"{name}: {seconds * 1e6:.2f} µs/step")
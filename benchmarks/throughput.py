@@ -0,0 +1,64 @@
+# throughput.py
+#
+# Copyright 2024 kramo
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+"""Runs per second of workflows of different lengths made of the built-in actions."""
+
+from itertools import cycle, islice
+
+from actions.actions import ReturnAction, WaitAction, groups
+from actions.engine import ActionSpec, Workflow
+from benchmarks import measure
+
+LENGTHS = (10, 100, 1000)
+RUNS = 100
+
+# Waiting would only measure the timeout and returning would end the run
+IDENTS = tuple(
+    action.ident
+    for actions in groups.values()
+    for action in actions
+    if action not in (WaitAction, ReturnAction)
+)
+
+
+def run(lengths: tuple[int, ...] = LENGTHS, runs: int = RUNS) -> dict:
+    """Runs the benchmark and returns the runs per second for each length and mode."""
+    results = {}
+
+    for length in lengths:
+        # Without memoizing, so every run executes each action
+        workflow = Workflow(
+            (ActionSpec(ident) for ident in islice(cycle(IDENTS), length)),
+            cache=None,
+        )
+
+        for parallel in (False, True):
+            seconds = measure(
+                lambda workflow=workflow, parallel=parallel: [
+                    workflow.run(parallel=parallel) for _index in range(runs)
+                ]
+            )
+            results[f"{length}-steps{'-parallel' if parallel else ''}"] = runs / seconds
+
+    return results
+
+
+if __name__ == "__main__":
+    for name, runs_per_second in run().items():
+        print(f"{name}: {runs_per_second:.0f} runs/s")
@@ -0,0 +1,61 @@
+# conftest.py
+#
+# Copyright 2024 kramo
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+"""Makes the `actions` package importable from the source tree."""
+
+import gettext
+import importlib.util
+import sys
+from pathlib import Path
+
+import gi
+
+gi.require_version("Gtk", "4.0")
+gi.require_version("Adw", "1")
+
+# pylint: disable=wrong-import-position
+
+# So the tests don't depend on the directory they are started from
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import actions
+
+gettext.install("actions")
+
+# `shared.py` is generated by Meson, so fill it in like a development build would
+if importlib.util.find_spec("actions.shared") is None:
+    source = (
+        Path(actions.__file__).with_name("shared.py.in").read_text(encoding="utf-8")
+    )
+
+    for key, value in {
+        "APP_ID": "page.kramo.Actions.Devel",
+        "VERSION": "0.1.0",
+        "PREFIX": "/page/kramo/Actions/Devel",
+        "PROFILE": "development",
+    }.items():
+        source = source.replace(f"@{key}@", value)
+
+    spec = importlib.util.spec_from_loader("actions.shared", loader=None)
+    shared = importlib.util.module_from_spec(spec)
+    exec(
+        compile(source, "shared.py.in", "exec"), shared.__dict__
+    )  # pylint: disable=exec-used
+
+    sys.modules["actions.shared"] = actions.shared = shared
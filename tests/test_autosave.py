@@ -0,0 +1,71 @@
+# test_autosave.py
+#
+# Copyright 2024 kramo
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+"""Tests for journaling and recovering edits of a workflow."""
+
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+
+from actions.autosave import Autosave
+from actions.engine import ActionSpec
+
+
+def test_recovers_flushed_edits(tmp_path: Path) -> None:
+    autosave = Autosave(tmp_path)
+    autosave.add("float", {"float": 1.0})
+    autosave.set_prop(0, "float", 2.0)
+    autosave.flush()
+
+    assert Autosave(tmp_path).recover() == [ActionSpec("float", {"float": 2.0}, {})]
+
+
+def test_flush_records_edits_from_before_flush(tmp_path: Path) -> None:
+    autosave = Autosave(tmp_path)
+    autosave.add("float", {"float": 1.0})
+    autosave.flush()
+
+    # Like rows with `lazy-props`, which only set props when pulled
+    autosave.before_flush = lambda: autosave.set_prop(0, "float", 3.0)
+    autosave.schedule_flush()
+    autosave.flush()
+
+    assert Autosave(tmp_path).recover() == [ActionSpec("float", {"float": 3.0}, {})]
+
+
+def test_discard_during_compaction(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    merges = []
+    monkeypatch.setattr(
+        "actions.autosave.threading.Thread",
+        lambda target, daemon: SimpleNamespace(start=lambda: merges.append(target)),
+    )
+
+    autosave = Autosave(tmp_path, compact_after=1)
+    autosave.add("float", {"float": 1.0})
+    autosave.flush()
+
+    # Closed while the journal is being merged
+    autosave.discard()
+    merges.pop()()
+
+    assert Autosave(tmp_path).recover() is None
+    assert not any(tmp_path.iterdir())
@@ -0,0 +1,228 @@
+# test_engine.py
+#
+# Copyright 2024 kramo
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+"""Tests for running workflows in order and by their dependency graph."""
+
+import time
+from typing import Callable
+
+from gi.repository import GLib
+
+from actions.actions import Action, Invocation, ReturnAction
+from actions.engine import (
+    ActionSpec,
+    Binding,
+    DagExecutor,
+    Executor,
+    Plan,
+    Workflow,
+    compile_plan,
+)
+from actions.timers import timers
+
+# Generous, so loaded machines don't fail the tests
+TOLERANCE = 0.15
+
+# Timers have a precision of one millisecond
+EARLY = 0.002
+
+
+class RecordAction(Action):
+    """Logs when it starts and finishes, returning its `value` plus one."""
+
+    __gtype_name__ = "ActionsTestRecordAction"
+
+    ident = "test-record"
+    type = float
+
+    def __init__(self, name: str, log: list, seconds: float = 0) -> None:
+        super().__init__()
+
+        self.log = log
+        self.props = {"name": name, "seconds": seconds, "value": 0.0}
+
+    def _get_action_func(self) -> Callable:
+        def record(call: Invocation) -> None:
+            name = call.props["name"]
+            self.log.append(("start", name, call.props["value"]))
+
+            def done() -> None:
+                self.log.append(("done", name))
+                call.done(call.props["value"] + 1)
+
+            if call.props["seconds"]:
+                timers.add(call.props["seconds"], done)
+            else:
+                done()
+
+        return record
+
+
+def run(plan: Plan, parallel: bool) -> tuple[Executor, float]:
+    """Runs `plan` on a main loop and returns the executor and the time it took."""
+    loop = GLib.MainLoop()
+    executor = (DagExecutor if parallel else Executor)(plan, loop.quit)
+
+    start = time.perf_counter()
+    executor.start()
+
+    if not executor.finished:
+        loop.run()
+
+    return executor, time.perf_counter() - start
+
+
+def run_workflow(specs: list[ActionSpec], parallel: bool) -> float:
+    """Runs a workflow made of `specs` and returns the time it took."""
+    return run(Workflow(specs).plan, parallel)[1]
+
+
+def test_independent_waits_overlap() -> None:
+    specs = [ActionSpec("wait", {"seconds": 0.2}), ActionSpec("wait", {"seconds": 0.3})]
+
+    elapsed = run_workflow(specs, parallel=True)
+    assert 0.3 - EARLY <= elapsed < 0.3 + TOLERANCE
+
+
+def test_waits_in_order_add_up() -> None:
+    specs = [ActionSpec("wait", {"seconds": 0.2}), ActionSpec("wait", {"seconds": 0.3})]
+
+    elapsed = run_workflow(specs, parallel=False)
+    assert 0.5 - EARLY <= elapsed < 0.5 + TOLERANCE
+
+
+def test_bound_actions_wait_for_their_sources() -> None:
+    log = []
+    actions = [
+        RecordAction("source", log, seconds=0.1),
+        RecordAction("independent", log),
+        RecordAction("bound", log),
+    ]
+    plan = compile_plan(actions, (Binding(2, "value", 0),), cache=None)
+
+    executor, _elapsed = run(plan, parallel=True)
+
+    assert executor.finished
+    assert log.index(("start", "independent", 0.0)) < log.index(("done", "source"))
+    assert log.index(("done", "source")) < log.index(("start", "bound", 1.0))
+    assert executor.context.retvals == [1.0, 1.0, 2.0]
+
+
+def test_chain_runs_in_order() -> None:
+    log = []
+    actions = [RecordAction(str(index), log, seconds=0.01) for index in range(5)]
+    plan = compile_plan(
+        actions, (Binding(index, "value", index - 1) for index in range(1, 5)), None
+    )
+
+    run(plan, parallel=True)
+
+    assert [entry[1] for entry in log] == [
+        name for index in range(5) for name in (str(index), str(index))
+    ]
+    assert log[-1] == ("done", "4")
+
+
+def _run_with_return(parallel: bool) -> tuple[Executor, list]:
+    log = []
+    actions = [
+        RecordAction("before", log, seconds=0.05),
+        ReturnAction(),
+        RecordAction("after", log),
+    ]
+
+    executor, _elapsed = run(compile_plan(actions, cache=None), parallel)
+    return executor, log
+
+
+def test_return_is_a_barrier() -> None:
+    executor, log = _run_with_return(parallel=True)
+
+    assert executor.finished
+    assert ("done", "before") in log
+    assert not any(entry[1] == "after" for entry in log)
+
+
+def test_return_ends_in_order_runs() -> None:
+    executor, log = _run_with_return(parallel=False)
+
+    assert executor.finished
+    assert not any(entry[1] == "after" for entry in log)
+
+
+def test_failing_action_ends_run() -> None:
+    for parallel in (False, True):
+        log = []
+        actions = [
+            RecordAction("before", log),
+            RecordAction("failing", log),
+            RecordAction("after", log),
+        ]
+        actions[1].props["value"] = "not a number"
+        plan = compile_plan(actions, (Binding(2, "value", 1),), cache=None)
+        finished = []
+
+        executor = (DagExecutor if parallel else Executor)(
+            plan, lambda: finished.append(True)
+        )
+        executor.start()
+
+        assert executor.finished
+        assert finished == [True]
+        assert ("done", "before") in log
+        assert not any(entry[1] == "after" for entry in log)
+
+
+def test_empty_plan_finishes() -> None:
+    for parallel in (False, True):
+        executor, _elapsed = run(compile_plan(()), parallel)
+        assert executor.finished
+
+
+def test_cancel_removes_pending_wait() -> None:
+    workflow = Workflow([ActionSpec("wait", {"seconds": 0.2}), ActionSpec("float")])
+    pending = len(timers)
+    finished = []
+
+    executor = workflow.run(lambda: finished.append(True))
+    assert len(timers) == pending + 1
+
+    executor.cancel()
+
+    assert executor.cancelled
+    assert finished == [True]
+    assert len(timers) == pending
+
+    # Nothing fires later on either
+    loop = GLib.MainLoop()
+    GLib.timeout_add(300, loop.quit)
+    loop.run()
+
+    assert not executor.context.completed[0]
+    assert finished == [True]
+
+
+def test_cancel_after_finishing_does_nothing() -> None:
+    executor, _elapsed = run(
+        Workflow([ActionSpec("wait", {"seconds": 0.01})]).plan, parallel=False
+    )
+    executor.cancel()
+
+    assert executor.finished
+    assert not executor.cancelled
@@ -0,0 +1,162 @@
+# test_autosave.py
+#
+# Copyright 2024 kramo
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+"""Tests for triggers and firing schedules, on a clock that only moves when told to."""
+
+import math
+from datetime import datetime
+from types import SimpleNamespace
+
+import pytest
+
+from actions.scheduler import (
+    CronTrigger,
+    IntervalTrigger,
+    Misfire,
+    Scheduler,
+    parse_trigger,
+)
+
+
+def _next(expression: str, after: datetime) -> datetime:
+    return datetime.fromtimestamp(CronTrigger(expression).get_next(after.timestamp()))
+
+
+def _fridays_or_tenths(after: datetime) -> datetime:
+    return _next("0 12 10 * 5", after)
+
+
+def test_cron_day_of_month_or_weekday() -> None:
+    # Sunday, the following Friday is the 6th
+    assert _fridays_or_tenths(datetime(2026, 2, 1)) == datetime(2026, 2, 6, 12)
+    assert _fridays_or_tenths(datetime(2026, 2, 6, 12)) == datetime(2026, 2, 10, 12)
+    assert _fridays_or_tenths(datetime(2026, 2, 10, 12)) == datetime(2026, 2, 13, 12)
+
+
+def test_cron_single_restricted_day() -> None:
+    assert _next("0 12 * * 5", datetime(2026, 2, 7)) == datetime(2026, 2, 13, 12)
+    assert _next("0 12 10 * *", datetime(2026, 2, 1)) == datetime(2026, 2, 10, 12)
+
+    # Both 0 and 7 are Sunday
+    assert _next("0 0 * * 7", datetime(2026, 2, 2)) == datetime(2026, 2, 8)
+
+
+def test_cron_february_29th() -> None:
+    assert _next("30 6 29 2 *", datetime(2026, 3, 1)) == datetime(2028, 2, 29, 6, 30)
+
+
+def test_cron_steps_and_ranges() -> None:
+    assert _next("*/15 9-17 * * 1-5", datetime(2026, 2, 6, 17, 50)) == datetime(
+        2026, 2, 9, 9
+    )
+
+
+@pytest.mark.parametrize("text", ("0", "-1", "inf", "nan", "soon", "60 * * *"))
+def test_invalid_triggers(text: str) -> None:
+    with pytest.raises(ValueError):
+        parse_trigger(text)
+
+
+def test_interval_trigger() -> None:
+    trigger = IntervalTrigger(60, start=100)
+
+    assert trigger.get_next(0) == 100
+    assert trigger.get_next(100) == 160
+    assert math.isclose(trigger.get_next(1000.5), 1060)
+
+
+class ManualScheduler(Scheduler):
+    """Takes the time from `now` and never arms a real timeout."""
+
+    def __init__(self, window: float = 0.05) -> None:
+        self.now = 0.0
+        super().__init__(window, clock=lambda: self.now)
+
+    def wake(self, now: float) -> None:
+        """Wakes up at `now`, like the armed timeout would."""
+        self.now = now
+        self._on_timeout()
+
+
+@pytest.fixture(autouse=True)
+def no_timeouts(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(
+        "actions.scheduler.GLib",
+        SimpleNamespace(timeout_add=lambda *_args: 1, source_remove=lambda _id: True),
+    )
+
+
+@pytest.mark.parametrize(
+    ("misfire", "fired"), ((Misfire.SKIP, []), (Misfire.ONCE, [400.5]))
+)
+def test_misfire(misfire: Misfire, fired: list[float]) -> None:
+    scheduler = ManualScheduler()
+    times = []
+    schedule = scheduler.add(
+        IntervalTrigger(60, start=100), lambda: times.append(scheduler.now), misfire
+    )
+
+    # Several intervals were missed, like during a suspend
+    scheduler.wake(400.5)
+
+    assert times == fired
+    assert schedule.next_time == 460
+
+
+def test_late_within_grace_fires() -> None:
+    scheduler = ManualScheduler()
+    times = []
+    scheduler.add(
+        IntervalTrigger(60, start=100),
+        lambda: times.append(scheduler.now),
+        Misfire.SKIP,
+    )
+
+    scheduler.wake(100.5)
+    assert times == [100.5]
+
+
+def test_coalesces_schedules_due_together() -> None:
+    scheduler = ManualScheduler(window=0.05)
+    fired = []
+
+    for name, start in (("a", 100), ("b", 100.03), ("c", 100.1)):
+        scheduler.add(
+            IntervalTrigger(60, start=start), lambda name=name: fired.append(name)
+        )
+
+    scheduler.wake(100)
+    assert fired == ["a", "b"]
+
+    scheduler.wake(100.1)
+    assert fired == ["a", "b", "c"]
+    assert len(scheduler) == 3
+
+
+def test_cancelled_schedule_does_not_fire() -> None:
+    scheduler = ManualScheduler()
+    fired = []
+
+    scheduler.add(IntervalTrigger(60, start=100), lambda: fired.append("kept"))
+    scheduler.add(IntervalTrigger(60, start=100), lambda: fired.append("no")).cancel()
+
+    assert len(scheduler) == 1
+
+    scheduler.wake(100)
+    assert fired == ["kept"]
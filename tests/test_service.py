@@ -0,0 +1,154 @@
+# test_autosave.py
+#
+# Copyright 2024 kramo
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+"""Tests for running workflows over D-Bus."""
+
+import shutil
+from typing import Any, Callable, Iterator
+
+import pytest
+from gi.repository import Gio, GLib
+
+from actions.engine import ActionSpec, Workflow
+from actions.service import INTERFACE, WorkflowService
+
+OBJECT_PATH = "/page/kramo/Actions/Test"
+TIMEOUT = 5
+
+
+def _iterate_until(predicate: Callable[[], bool]) -> None:
+    context = GLib.MainContext.default()
+    deadline = GLib.get_monotonic_time() + TIMEOUT * 1_000_000
+
+    while not predicate():
+        assert GLib.get_monotonic_time() < deadline, "Timed out"
+        context.iteration(False)
+
+
+def _connect(address: str) -> Gio.DBusConnection:
+    return Gio.DBusConnection.new_for_address_sync(
+        address,
+        Gio.DBusConnectionFlags.AUTHENTICATION_CLIENT
+        | Gio.DBusConnectionFlags.MESSAGE_BUS_CONNECTION,
+        None,
+        None,
+    )
+
+
+@pytest.fixture
+def bus() -> Iterator[Gio.TestDBus]:
+    if not shutil.which("dbus-daemon"):
+        pytest.skip("dbus-daemon is not installed")
+
+    test_dbus = Gio.TestDBus.new(Gio.TestDBusFlags.NONE)
+    test_dbus.up()
+    yield test_dbus
+    test_dbus.down()
+
+
+class Client:
+    """Calls the service from its own connection, like another process would."""
+
+    def __init__(self, address: str, name: str) -> None:
+        self.connection = _connect(address)
+        self.name = name
+        self.finished: list[int] = []
+
+        self.connection.signal_subscribe(
+            name,
+            INTERFACE,
+            "RunFinished",
+            OBJECT_PATH,
+            None,
+            Gio.DBusSignalFlags.NONE,
+            lambda *args: self.finished.append(args[-1].unpack()[0]),
+        )
+
+    def call(self, method: str, parameters: Any, reply_type: str) -> Any:
+        """Calls `method` and iterates the main context until it returns."""
+        replies = []
+
+        # The service replies from this thread, so the call can't block it
+        self.connection.call(
+            self.name,
+            OBJECT_PATH,
+            INTERFACE,
+            method,
+            parameters,
+            GLib.VariantType.new(reply_type),
+            Gio.DBusCallFlags.NONE,
+            TIMEOUT * 1000,
+            None,
+            lambda connection, result: replies.append(connection.call_finish(result)),
+        )
+
+        _iterate_until(lambda: bool(replies))
+        return replies[0].unpack()
+
+    def close(self) -> None:
+        """Closes the connection."""
+        self.connection.close_sync(None)
+
+
+@pytest.fixture
+def client(bus: Gio.TestDBus) -> Iterator[Client]:
+    connection = _connect(bus.get_bus_address())
+    service = WorkflowService(connection, OBJECT_PATH)
+    service.add_workflow("float", Workflow([ActionSpec("float")]))
+    service.add_workflow("wait", Workflow([ActionSpec("wait", {"seconds": 60})]))
+    service.register()
+
+    client = Client(bus.get_bus_address(), connection.get_unique_name())
+    yield client
+
+    client.close()
+    service.unregister()
+    connection.close_sync(None)
+
+
+def test_list_workflows(client: Client) -> None:
+    assert client.call("ListWorkflows", None, "(as)") == (["float", "wait"],)
+
+
+def test_run_finishes(client: Client) -> None:
+    (run_id,) = client.call("Run", GLib.Variant("(sa{ua{sv}})", ("float", {})), "(t)")
+
+    _iterate_until(lambda: run_id in client.finished)
+
+
+def test_cancel_finishes_run(client: Client) -> None:
+    (run_id,) = client.call("Run", GLib.Variant("(sa{ua{sv}})", ("wait", {})), "(t)")
+
+    assert client.call("Cancel", GLib.Variant("(t)", (run_id,)), "(b)") == (True,)
+    _iterate_until(lambda: run_id in client.finished)
+    assert client.call("Cancel", GLib.Variant("(t)", (run_id,)), "(b)") == (False,)
+
+
+@pytest.mark.parametrize(
+    "inputs",
+    ({1: {"seconds": 1}}, {0: {"minutes": 1}}, {0: {"seconds": "abc"}}),
+)
+def test_rejects_invalid_inputs(inputs: dict[int, dict]) -> None:
+    service = WorkflowService(None, OBJECT_PATH)
+    service.add_workflow("wait", Workflow([ActionSpec("wait")]))
+
+    with pytest.raises((IndexError, ValueError)):
+        service.run("wait", inputs)
+
+    assert not service.runs
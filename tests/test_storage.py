@@ -0,0 +1,64 @@
+# test_autosave.py
+#
+# Copyright 2024 kramo
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+"""Tests for saving and loading workflows."""
+
+from io import StringIO
+
+import pytest
+
+from actions.engine import ActionSpec
+from actions.storage import dump, load
+
+HEADER = '{"format":"page.kramo.Actions.Workflow","version":1}\n'
+
+
+def test_round_trip() -> None:
+    specs = [
+        ActionSpec("float", {"float": 1.0}, {}),
+        ActionSpec("float", {"float": 0.0}, {"float": 0}),
+    ]
+    file = StringIO()
+    dump(specs, file)
+    file.seek(0)
+
+    assert load(file) == specs
+
+
+@pytest.mark.parametrize(
+    "line",
+    (
+        "not json",
+        '"float"',
+        '["float",{}]',
+        "[1,{},{}]",
+        '["float",[],{}]',
+        '["float",{},null]',
+        '["float",{},{"float":"0"}]',
+        '["float",{},{"float":true}]',
+    ),
+)
+def test_malformed_action(line: str) -> None:
+    with pytest.raises(ValueError, match="line 2"):
+        load(StringIO(HEADER + line + "\n"))
+
+
+def test_not_a_workflow() -> None:
+    with pytest.raises(ValueError):
+        load(StringIO("[]\n"))
@@ -0,0 +1,155 @@
+# test_autosave.py
+#
+# Copyright 2024 kramo
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+"""Tests for the timer wheel, on a clock that only moves when told to."""
+
+from actions.timers import BITS, TimerWheel
+
+
+class ManualWheel(TimerWheel):
+    """Fires timers when `advance()` passes the tick it would have armed a timeout for."""
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.now = 0
+
+    def advance(self, ms: int) -> None:
+        """Moves the clock `ms` ahead, firing timers in batches like timeouts would."""
+        target = self.now + ms
+
+        while self._armed is not None and self._armed <= target:
+            self.now = self._armed
+            self._on_timeout()
+
+        self.now = target
+
+    def jump(self, ms: int) -> None:
+        """Moves the clock `ms` ahead and fires everything due in a single late batch."""
+        self.now += ms
+        self._on_timeout()
+
+    def _now(self) -> int:
+        return self.now
+
+    def _arm(self) -> None:
+        self._armed = self._get_next()
+
+
+def test_fires_in_order() -> None:
+    wheel = ManualWheel()
+    fired = []
+
+    for ms in (30, 10, 20):
+        wheel.add(ms / 1000, lambda ms=ms: fired.append((ms, wheel.now)))
+
+    wheel.advance(100)
+    assert fired == [(10, 10), (20, 20), (30, 30)]
+    assert not wheel
+
+
+def test_late_batch_keeps_order() -> None:
+    wheel = ManualWheel()
+    fired = []
+
+    for ms in (30, 10, 20):
+        wheel.add(ms / 1000, fired.append, ms)
+
+    wheel.jump(100)
+    assert fired == [10, 20, 30]
+
+
+def test_cascades_down_levels() -> None:
+    wheel = ManualWheel()
+    fired = []
+
+    # On the third and fourth level, moved down as their slots come up
+    for ms in (5000, 300_000):
+        assert ms > 1 << (BITS * 2)
+        wheel.add(ms / 1000, lambda: fired.append(wheel.now))
+
+    wheel.advance(4999)
+    assert not fired
+
+    wheel.advance(1)
+    assert fired == [5000]
+
+    wheel.advance(300_000)
+    assert fired == [5000, 300_000]
+    assert not wheel
+
+
+def test_cancel() -> None:
+    wheel = ManualWheel()
+    fired = []
+
+    timer = wheel.add(0.05, fired.append, "cancelled")
+    wheel.add(0.1, fired.append, "kept")
+    timer.cancel()
+
+    assert len(wheel) == 1
+    assert not timer.pending
+
+    wheel.advance(200)
+    assert fired == ["kept"]
+
+
+def test_cancel_in_same_batch() -> None:
+    wheel = ManualWheel()
+    fired = []
+
+    def first() -> None:
+        fired.append("first")
+        second.cancel()
+
+    wheel.add(0.05, first)
+    second = wheel.add(0.05, fired.append, "second")
+
+    wheel.advance(100)
+    assert fired == ["first"]
+    assert not wheel
+
+
+def test_same_tick_fires_together() -> None:
+    wheel = ManualWheel()
+    batches = []
+
+    def record(name: str) -> None:
+        batches.append((name, wheel.now))
+
+    for name in "abc":
+        wheel.add(0.05, record, name)
+
+    wheel.advance(49)
+    assert not batches
+
+    wheel.advance(1)
+    assert batches == [("a", 50), ("b", 50), ("c", 50)]
+
+
+def test_add_from_callback() -> None:
+    wheel = ManualWheel()
+    fired = []
+
+    wheel.add(0.01, lambda: wheel.add(0, lambda: fired.append(wheel.now)))
+
+    wheel.advance(10)
+    assert not fired
+
+    wheel.advance(1)
+    assert fired == [11]